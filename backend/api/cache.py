@@ -0,0 +1,236 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db.models import Count, Exists, Max, OuterRef
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from rest_framework.response import Response
+
+from recipes.invalidation import user_versions
+from recipes.models import Recipe
+from recipes.versions import get_version, get_versions
+from users.models import Follow
+
+from .renderers import FastJSONRenderer
+
+
+class ReferenceDataCacheMixin:
+    """Cache responses of read-mostly reference data (tags, ingredients).
+
+    Responses carry an ETag derived from the version stamp of the data
+    and from its row count and last id, `If-None-Match` requests get a 304
+    while the data is unchanged. The unfiltered list is kept in the cache
+    as rendered JSON bytes under the same state.
+    """
+
+    reference_name = None
+
+    def get_state(self):
+        """Return the version stamp and the row count and last id.
+
+        The rows are counted in one query, so rows added or deleted by
+        another process, such as the import commands, are seen even when
+        the version stamp is kept in a cache local to each process.
+        """
+        if not hasattr(self, '_state'):
+            rows = self.get_queryset().aggregate(
+                count=Count('id'), last=Max('id'))
+            self._state = '{}-{}-{}'.format(
+                get_version(self.reference_name), rows['count'],
+                rows['last'])
+        return self._state
+
+    def get_etag(self, request):
+        query = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        return f'"{self.reference_name}-{self.get_state()}-{query}"'
+
+    def conditional(self, request, get_response):
+        """Return 304 for a matching If-None-Match, or the response."""
+        etag = self.get_etag(request)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = get_response()
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            patch_cache_control(response, no_cache=True)
+        return response
+
+    def get_list_response(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def cached_list(self, request, *args, **kwargs):
+        if request.query_params:
+            return self.get_list_response(request, *args, **kwargs)
+        key = 'reference:{}:{}'.format(self.reference_name, self.get_state())
+        content = cache.get(key)
+        if content is None:
+            response = self.get_list_response(request, *args, **kwargs)
+            content = FastJSONRenderer().render(response.data)
+            cache.set(key, content)
+        return HttpResponse(content, content_type='application/json')
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(
+            request, lambda: self.cached_list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(
+            request, lambda: super(ReferenceDataCacheMixin, self).retrieve(
+                request, *args, **kwargs))
+
+
+class RecipeResponseCacheMixin:
+    """Cache the recipe responses serialized as seen by an anonymous user.
+
+    The flags depending on the user, `is_favorited`, `is_in_shopping_cart`
+    and the `is_subscribed` of the author, are fetched in one query per
+    request and laid over the cached data. A response is cached under
+    the version stamps of the data it shows, see `recipes.invalidation`:
+    a recipe, the recipes of an author, all the recipes, and the
+    favorites, shopping list or subscriptions of the user.
+    """
+
+    rendering_shared = False
+
+    def get_queryset_user(self):
+        """Return the user the recipes are serialized for."""
+        if self.rendering_shared:
+            return AnonymousUser()
+        return self.request.user
+
+    def get_cache_versions(self, request):
+        """Return the names of the version stamps of the response."""
+        if self.action == 'retrieve':
+            return ['recipes', f'recipe:{self.kwargs["pk"]}']
+        params = request.query_params
+        author = params.get('author')
+        names = ['recipes', f'author:{author}' if author else 'recipe_lists']
+        kinds = [kind for kind, param in (
+            ('favorites', 'is_favorited'),
+            ('cart', 'is_in_shopping_cart'),
+        ) if param in params]
+        if self.action == 'feed':
+            kinds.append('feed')
+        return names + list(user_versions(request.user.id, *kinds))
+
+    def get_cache_key(self, request):
+        names = self.get_cache_versions(request)
+        versions = ','.join(
+            f'{name}={version}'
+            for name, version in zip(names, get_versions(*names)))
+        key = f'{request.build_absolute_uri()} {versions}'
+        return 'recipes:' + hashlib.md5(key.encode()).hexdigest()
+
+    def overlay_user_flags(self, request, data):
+        """Set the flags of the current user on the serialized recipes."""
+        items = data['results'] if 'results' in data else [data]
+        if not request.user.is_authenticated or not items:
+            return
+        flags = Recipe.objects.filter(
+            id__in=[item['id'] for item in items]
+        ).with_user_flags(request.user).annotate(
+            subscribed=Exists(Follow.objects.filter(
+                user=request.user, following=OuterRef('author')))
+        ).values_list(
+            'id', 'is_favorited', 'is_in_shopping_cart', 'subscribed')
+        flags = {id: values for id, *values in flags}
+        for item in items:
+            if item['id'] in flags:
+                (item['is_favorited'], item['is_in_shopping_cart'],
+                 item['author']['is_subscribed']) = flags[item['id']]
+
+    def cached_response(self, request, get_response):
+        key = self.get_cache_key(request)
+        data = cache.get(key)
+        if data is None:
+            self.rendering_shared = True
+            try:
+                response = get_response()
+            finally:
+                self.rendering_shared = False
+            if response.status_code != 200:
+                return response
+            data = response.data
+            cache.set(key, data, settings.RECIPE_RESPONSE_CACHE_TIMEOUT)
+        self.overlay_user_flags(request, data)
+        return Response(data)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, lambda: super(RecipeResponseCacheMixin, self).list(
+                request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, lambda: super(RecipeResponseCacheMixin, self).retrieve(
+                request, *args, **kwargs))
+
+
+class RecipeConditionalMixin:
+    """Answer conditional requests of the recipe list and detail.
+
+    The ETag of a response is derived from the newest `updated` time and
+    the number of the recipes requested, the version stamps the response
+    is cached under and, for a user, the stamps of their favorites,
+    shopping list and subscriptions. A matching
+    `If-None-Match` gets a 304 before anything is serialized.
+
+    No Last-Modified date is sent: the newest `updated` time does not
+    change when a recipe is deleted or its author, tags or ingredients
+    change, so `If-Modified-Since` would get stale 304s.
+    """
+
+    def get_conditional_queryset(self):
+        if self.action == 'retrieve':
+            return Recipe.objects.filter(pk=self.kwargs['pk'])
+        return self.filter_queryset(Recipe.objects.all()).order_by()
+
+    def get_etag(self, request):
+        """Return the ETag of the response, None if there are no recipes.
+
+        A malformed recipe id has no ETag either, the view answers 404.
+        """
+        try:
+            state = self.get_conditional_queryset().aggregate(
+                updated=Max('updated'), count=Count('id'))
+        except (TypeError, ValueError):
+            return None
+        if not state['count']:
+            return None
+        names = self.get_cache_versions(request)
+        if request.user.is_authenticated:
+            names += [
+                name for name in user_versions(
+                    request.user.id, 'favorites', 'cart', 'feed')
+                if name not in names
+            ]
+        tag = '{} {} {} {}'.format(
+            request.get_full_path(), state['updated'].isoformat(),
+            state['count'], get_versions(*names))
+        return '"{}"'.format(hashlib.md5(tag.encode()).hexdigest())
+
+    def conditional(self, request, get_response):
+        etag = self.get_etag(request)
+        if etag is None:
+            return get_response()
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = get_response()
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            patch_cache_control(
+                response, no_cache=True,
+                private=request.user.is_authenticated)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(
+            request, lambda: super(RecipeConditionalMixin, self).list(
+                request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(
+            request, lambda: super(RecipeConditionalMixin, self).retrieve(
+                request, *args, **kwargs))
@@ -0,0 +1,99 @@
+import csv
+import os
+import tempfile
+
+from django.conf import settings
+from django.db.models import F
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from recipes.models import ShoppingListItem
+
+CHUNK_SIZE = 64 * 1024
+PDF_FONT_NAME = 'ShoppingListFont'
+PDF_FONT_SIZE = 12
+PDF_MARGIN = 50
+
+
+def shopping_cart_rows(user):
+    """Return the ingredients of the user's shopping list with totals."""
+    return ShoppingListItem.objects.filter(user=user).values(
+        'total_amount',
+        name=F('ingredient__name'),
+        measurement_unit=F('ingredient__measurement_unit'),
+    ).order_by('ingredient__name')
+
+
+def format_row(row):
+    """Format a shopping list row as a line of text."""
+    return (f"{row['name'].capitalize()} ({row['measurement_unit']})"
+            f" - {row['total_amount']}")
+
+
+def export_txt(rows):
+    """Yield the shopping list as lines of plain text."""
+    for row in rows:
+        yield format_row(row) + '\n'
+
+
+class Echo:
+    """File-like object returning what is written, for the csv writer."""
+
+    def write(self, value):
+        return value
+
+
+def export_csv(rows):
+    """Yield the shopping list as CSV lines."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for row in rows:
+        yield writer.writerow(
+            (row['name'], row['measurement_unit'], row['total_amount']))
+
+
+def get_pdf_font():
+    """Register the font for the PDF, it must support Cyrillic."""
+    font_path = settings.SHOPPING_CART_PDF_FONT
+    if PDF_FONT_NAME in pdfmetrics.getRegisteredFontNames():
+        return PDF_FONT_NAME
+    if not os.path.exists(font_path):
+        return 'Helvetica'
+    pdfmetrics.registerFont(TTFont(PDF_FONT_NAME, font_path))
+    return PDF_FONT_NAME
+
+
+def export_pdf(rows):
+    """Yield the shopping list as a PDF document.
+
+    A PDF cannot be written sequentially, so the document is rendered
+    page by page into a temporary file, which spills to disk once it gets
+    large, and then streamed in chunks.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=CHUNK_SIZE * 16) as file:
+        pdf = canvas.Canvas(file, pagesize=A4)
+        font = get_pdf_font()
+        width, height = A4
+        line_height = PDF_FONT_SIZE * 1.5
+        y = height - PDF_MARGIN
+        pdf.setFont(font, PDF_FONT_SIZE)
+        for row in rows:
+            if y < PDF_MARGIN:
+                pdf.showPage()
+                pdf.setFont(font, PDF_FONT_SIZE)
+                y = height - PDF_MARGIN
+            pdf.drawString(PDF_MARGIN, y, format_row(row))
+            y -= line_height
+        pdf.save()
+        file.seek(0)
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+            yield chunk
+
+
+EXPORTERS = {
+    'txt': export_txt,
+    'csv': export_csv,
+    'pdf': export_pdf,
+}
@@ -1,22 +1,183 @@
 import base64
+from collections import Counter
+from tempfile import SpooledTemporaryFile
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
 from rest_framework import serializers
 
+from recipes.images import variant_name
+
+# Number of base64 characters decoded at once, a multiple of 4.
+BASE64_CHUNK_SIZE = 64 * 1024
+BASE64_WHITESPACE = ' \t\r\n'
+DATA_URI_PREFIX = 'data:image/'
+DATA_URI_SEPARATOR = ';base64,'
+# Length of the longest accepted data URI header.
+DATA_URI_MAX_HEADER = 64
+# Leading bytes of the accepted image formats.
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+)
+
+
+def sniff_image_format(header):
+    """Return the image format from the first bytes of the file."""
+    for signature, image_format in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return image_format
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'WEBP'
+    return None
+
+
+def decoded_size(data, start):
+    """Return the size of the base64 encoded data from `start` on.
+
+    Line breaks and other whitespace, as in MIME encoded data, are left out.
+    """
+    end = len(data)
+    while end > start and data[end - 1] in BASE64_WHITESPACE:
+        end -= 1
+    padding = data.count('=', max(start, end - 2), end)
+    length = end - start - sum(
+        data.count(char, start, end) for char in BASE64_WHITESPACE)
+    return length * 3 // 4 - padding
+
+
+def decode_base64(data, start, file):
+    """Decode the base64 data into the file chunk by chunk.
+
+    Whitespace is dropped from each chunk, the characters left over
+    after the last multiple of 4 are decoded with the next chunk.
+    """
+    rest = ''
+    for position in range(start, len(data), BASE64_CHUNK_SIZE):
+        chunk = rest + ''.join(
+            data[position:position + BASE64_CHUNK_SIZE].split())
+        end = len(chunk) - len(chunk) % 4
+        file.write(base64.b64decode(chunk[:end], validate=True))
+        rest = chunk[end:]
+    if rest:
+        raise ValueError('Incorrect base64 padding')
+    file.seek(0)
+
 
 class ImageConversion(serializers.Field):
-    """Serialization for image field in recipe."""
+    """Serialization for image field in recipe.
+
+    The image is received as an uploaded file or as a base64 data URI,
+    decoded in chunks into a temporary file after its size has been
+    checked against `RECIPE_IMAGE_MAX_SIZE`. Its type is taken from
+    the content, not from the declared one, and checked with Pillow.
+    It is shown as the url of the resized `variant`, or `list_variant`
+    when a list is serialized, once these are ready.
+    """
+
+    def __init__(self, variant=None, list_variant=None, **kwargs):
+        self.variant = variant
+        self.list_variant = list_variant or variant
+        super().__init__(**kwargs)
 
     def to_representation(self, value):
+        variant = self.variant
+        if isinstance(getattr(self.parent, 'parent', None),
+                      serializers.ListSerializer):
+            variant = self.list_variant
+        if variant and getattr(value.instance, 'thumbnails_ready', False):
+            return default_storage.url(variant_name(value.name, variant))
         return value.url
 
     def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            return self.check_image(data, data.size)
+        if not isinstance(data, str) or not data.startswith(DATA_URI_PREFIX):
+            raise serializers.ValidationError(
+                'Image must be base64 encoded'
+            )
+        start = data.find(DATA_URI_SEPARATOR, 0, DATA_URI_MAX_HEADER)
+        if start == -1:
+            raise serializers.ValidationError(
+                'Image must be base64 encoded'
+            )
+        start += len(DATA_URI_SEPARATOR)
+        size = decoded_size(data, start)
+        self.check_size(size)
+        file = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
         try:
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            file_name = "image." + ext
-            return ContentFile(base64.b64decode(imgstr), name=file_name)
+            decode_base64(data, start, file)
         except ValueError:
+            file.close()
             raise serializers.ValidationError(
                 'Image must be base64 encoded'
             )
+        return self.check_image(File(file), size)
+
+    def check_size(self, size):
+        max_size = settings.RECIPE_IMAGE_MAX_SIZE
+        if size > max_size:
+            raise serializers.ValidationError(
+                f'Image must not be larger than {max_size // 1024 ** 2} MB'
+            )
+
+    def check_image(self, file, size):
+        """Check the image file and name it after its real format."""
+        self.check_size(size)
+        try:
+            image_format = sniff_image_format(file.read(16))
+            if image_format is None:
+                raise ValueError('Unknown image format')
+            file.seek(0)
+            with Image.open(file) as image:
+                image.verify()
+        except (ValueError, OSError, Image.DecompressionBombError):
+            file.close()
+            raise serializers.ValidationError(
+                'Image must be a GIF, JPEG, PNG or WebP file'
+            )
+        file.seek(0)
+        file.name = f'image.{image_format.lower()}'
+        return file
+
+
+def duplicates(values):
+    """Return the sorted values present more than once."""
+    return sorted(
+        value for value, count in Counter(values).items() if count > 1)
+
+
+class PrimaryKeyListField(serializers.ListField):
+    """List of primary keys resolved into objects with a single query.
+
+    Duplicate and unknown keys are all reported in one error.
+    """
+
+    child = serializers.IntegerField()
+
+    def __init__(self, queryset, **kwargs):
+        self.queryset = queryset
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        keys = super().to_internal_value(data)
+        errors = []
+        repeated = duplicates(keys)
+        if repeated:
+            errors.append(f'Значения должны быть уникальными: {repeated}')
+        objects = self.queryset.in_bulk(keys)
+        missing = sorted(set(keys) - objects.keys())
+        if missing:
+            errors.append(f'Объекты не найдены: {missing}')
+        if errors:
+            raise serializers.ValidationError(errors)
+        return [objects[key] for key in keys]
+
+    def to_representation(self, value):
+        return [item.pk for item in value.all()]
@@ -1,18 +1,50 @@
+from django.core.cache import cache
+from django.db.models import BooleanField, Case, Subquery, Value, When
 from django_filters import rest_framework as filters
 from rest_framework import filters as filter
 
-from recipes.models import Recipe
+from recipes.models import Recipe, Tag
+from recipes.search import search_recipes
+from recipes.versions import get_version
+
+
+def tag_ids_by_slug():
+    """Return the ids of the tags by slug, cached until a tag changes."""
+    key = 'tags:slugs:{}'.format(get_version('tags'))
+    ids = cache.get(key)
+    if ids is None:
+        ids = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(key, ids)
+    return ids
+
+
+def tag_choices():
+    return [(slug, slug) for slug in tag_ids_by_slug()]
 
 
 class RecipeFilter(filters.FilterSet):
     """Filter recipes."""
 
     author = filters.CharFilter(field_name='author_id')
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices, method='filter_tags')
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
 
+    def filter_tags(self, queryset, name, value):
+        """Filter recipes having any of the tags.
+
+        The tag rows are matched in a subquery on the (tag, recipe) index
+        instead of a join, so a recipe is listed once whatever the number
+        of its matching tags.
+        """
+        ids = tag_ids_by_slug()
+        return queryset.filter(id__in=Subquery(
+            Recipe.tags.through.objects.filter(
+                tag_id__in=[ids[slug] for slug in value]
+            ).values('recipe_id')))
+
     def filter_is_favorited(self, queryset, name, value):
         """Filter recipes by favorites."""
         if self.request.user.is_authenticated:
@@ -34,7 +66,41 @@ class RecipeFilter(filters.FilterSet):
         fields = ['author', 'tags', 'is_favorited', 'is_in_shopping_cart']
 
 
-class IngredientFilter(filter.SearchFilter):
-    """Filter to search for ingredients."""
+class IngredientFilter(filter.BaseFilterBackend):
+    """Filter to search for ingredients.
+
+    Ingredients starting with the `name` come first, then the ones
+    containing it. On PostgreSQL both lookups use the indexes
+    on UPPER(name) created by the migrations.
+    """
 
     search_param = 'name'
+
+    def filter_queryset(self, request, queryset, view):
+        name = request.query_params.get(self.search_param)
+        if not name:
+            return queryset
+        return queryset.filter(name__icontains=name).annotate(
+            is_prefix=Case(
+                When(name__istartswith=name, then=Value(True)),
+                default=Value(False), output_field=BooleanField())
+        ).order_by('-is_prefix', 'name')
+
+
+class RecipeSearchFilter(filter.BaseFilterBackend):
+    """Full-text search of recipes by name, ingredients and description.
+
+    Matching recipes are ordered by relevance, unless an explicit
+    `ordering` is requested, so the backend goes after OrderingFilter.
+    """
+
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        queryset = search_recipes(queryset, query)
+        if 'ordering' in request.query_params:
+            return queryset
+        return queryset.order_by('-search_rank', '-id')
@@ -0,0 +1,52 @@
+import gzip
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from rest_framework.renderers import JSONRenderer
+
+from api.middleware import BROTLI_QUALITY, brotli
+from api.renderers import FastJSONRenderer
+
+PATHS = ('/api/ingredients/', '/api/recipes/?limit=100')
+
+
+def measure(render, data, repeat):
+    """Return the milliseconds spent rendering `data` on average."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        render(data)
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+class Command(BaseCommand):
+    """Command to compare the size and the rendering time of responses."""
+
+    help = "Compares JSON renderers and compression on hot API responses"
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', default=PATHS)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, paths, repeat, **options):
+        client = Client()
+        for path in paths:
+            response = client.get(path)
+            if response.status_code != 200:
+                self.stderr.write(f'{path}: {response.status_code}')
+                continue
+            data = json.loads(response.content)
+            standard = JSONRenderer().render(data)
+            fast = FastJSONRenderer().render(data)
+            sizes = [f'{len(standard)} B json', f'{len(fast)} B fast',
+                     f'{len(gzip.compress(fast, 6))} B gzip']
+            if brotli is not None:
+                sizes.append(
+                    f'{len(brotli.compress(fast, quality=BROTLI_QUALITY))}'
+                    ' B brotli')
+            self.stdout.write(
+                f'{path}: ' + ', '.join(sizes) + '; '
+                f'json {measure(JSONRenderer().render, data, repeat):.2f} ms,'
+                f' fast {measure(FastJSONRenderer().render, data, repeat):.2f}'
+                ' ms')
@@ -0,0 +1,40 @@
+import re
+
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+re_accepts_brotli = re.compile(r'\bbr\b')
+# Quality of the Brotli compression, fast enough for dynamic responses.
+BROTLI_QUALITY = 5
+# Responses shorter than this are not worth compressing.
+MIN_LENGTH = 200
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Compress responses with Brotli if the client accepts it and
+    the brotli package is installed, with gzip otherwise."""
+
+    def process_response(self, request, response):
+        if (brotli is None or response.streaming
+                or len(response.content) < MIN_LENGTH
+                or response.has_header('Content-Encoding')
+                or not re_accepts_brotli.search(
+                    request.META.get('HTTP_ACCEPT_ENCODING', ''))):
+            return super().process_response(request, response)
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed = brotli.compress(response.content, quality=BROTLI_QUALITY)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        # A compressed representation only weakly matches the ETag.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = 'br'
+        return response
@@ -0,0 +1,16 @@
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+
+
+class FallbackContentNegotiation(DefaultContentNegotiation):
+    """Use the first renderer when the Accept header matches none of them.
+
+    File downloads are selected with the `format` query parameter,
+    clients sending `Accept: application/json` still get the default file.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        try:
+            return super().select_renderer(request, renderers, format_suffix)
+        except NotAcceptable:
+            return renderers[0], renderers[0].media_type
@@ -1,5 +1,42 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class IdCursorPagination(CursorPagination):
+    """Keyset pagination on the `id` ordering of the view, without a count."""
+
+    page_size_query_param = 'limit'
+    ordering = '-id'
 
 
 class PageLimitPagination(PageNumberPagination):
+    """Page number pagination, or cursor pagination when `cursor` is passed.
+
+    Requesting `?cursor=` (empty for the first page) switches to keyset
+    pagination: the response has opaque `next` and `previous` links and
+    no `count`, so deep pages cost the same as the first one.
+    """
+
     page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    cursor_pagination_class = IdCursorPagination
+    cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            return super().paginate_queryset(queryset, request, view)
+        self.cursor_paginator = self.cursor_pagination_class()
+        page = self.cursor_paginator.paginate_queryset(
+            queryset, request, view)
+        self.display_page_controls = (
+            self.cursor_paginator.display_page_controls)
+        return page
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def to_html(self):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.to_html()
+        return super().to_html()
@@ -0,0 +1,32 @@
+import json
+
+from django.utils.datastructures import MultiValueDict
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+
+class MultiPartJSONParser(MultiPartParser):
+    """Parse multipart form data where some fields hold JSON.
+
+    The fields listed in the `multipart_json_fields` attribute of the view
+    are decoded from JSON, the others are kept as single values and
+    the uploaded files are streamed to disk by Django's upload handlers.
+    The files are returned among the data: DRF merges the files with
+    the data as lists when the data is not a QueryDict.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parsed = super().parse(stream, media_type, parser_context)
+        view = (parser_context or {}).get('view')
+        json_fields = getattr(view, 'multipart_json_fields', ())
+        data = {}
+        for key, value in parsed.data.items():
+            if key in json_fields:
+                try:
+                    value = json.loads(value)
+                except ValueError as error:
+                    raise ParseError(f'Field {key} is not valid JSON: {error}')
+            data[key] = value
+        for key in parsed.files:
+            data[key] = parsed.files[key]
+        return DataAndFiles(data, MultiValueDict())
@@ -0,0 +1,52 @@
+from rest_framework import renderers
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """Render JSON with orjson when it is installed.
+
+    The output is the compact UTF-8 JSON of the standard renderer.
+    Without orjson, or when an indented output is requested by the
+    browsable API, the standard renderer is used.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(
+                accepted_media_type or '', renderer_context or {}):
+            return super().render(
+                data, accepted_media_type, renderer_context)
+        return orjson.dumps(
+            data, default=self.encoder_class().default,
+            option=orjson.OPT_NON_STR_KEYS)
+
+
+class PlainTextRenderer(renderers.BaseRenderer):
+    """Render plain text, used to negotiate the shopping list format."""
+
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data
+        return str(data).encode(self.charset or 'utf-8')
+
+
+class CSVRenderer(PlainTextRenderer):
+    """Render CSV, used to negotiate the shopping list format."""
+
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class PDFRenderer(PlainTextRenderer):
+    """Render PDF, used to negotiate the shopping list format."""
+
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
@@ -1,15 +1,16 @@
 from django.contrib.auth import get_user_model
-from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserCreateSerializer
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
-from rest_framework.validators import UniqueTogetherValidator, UniqueValidator
+from rest_framework.validators import UniqueValidator
 
 from recipes.models import (Favorite, Ingredient, IngredientAmount, Recipe,
-                            Shopping, Tag)
+                            Shopping, ShoppingListItem, Tag)
 from users.models import Follow
 
-from .fields import ImageConversion
+from .fields import ImageConversion, PrimaryKeyListField, duplicates
 
 User = get_user_model()
 
@@ -43,6 +44,8 @@ class UserSerializer(UserCreateSerializer):
 
     def get_is_subscribed(self, obj):
         """Return the subscription status."""
+        if hasattr(obj, 'subscribed'):
+            return obj.subscribed
         user = self.context.get('request').user
         if user.is_authenticated:
             return Follow.objects.filter(
@@ -63,16 +66,43 @@ class RecipeSmallSerializer(serializers.ModelSerializer):
     - when added to favorites.
     """
 
+    image = ImageConversion(variant='preview', read_only=True)
+
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    """Serialize the recipe ids of a batch operation."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False, max_length=100)
+
+    def validate_ids(self, ids):
+        """Drop the repeated ids, keeping the order."""
+        return list(dict.fromkeys(ids))
+
+
+class PantrySerializer(serializers.Serializer):
+    """Serialize the query of the pantry matching."""
+
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False, max_length=100)
+    limit = serializers.IntegerField(
+        min_value=1, max_value=100, default=10)
+
+
 class SubscribeSerializer(serializers.ModelSerializer):
-    """Serialization for list of subscribers."""
+    """Serialization for list of subscribers.
+
+    The newest `recipes_limit` recipes are shown for every author,
+    use `prefetch_recipes` to load them for a page of authors at once.
+    """
 
-    recipes = RecipeSmallSerializer(
-        many=True, read_only=True, source='recipe')
+    recipes = serializers.SerializerMethodField()
     recipes_count = serializers.SerializerMethodField()
     is_subscribed = serializers.SerializerMethodField()
 
@@ -81,50 +111,48 @@ class SubscribeSerializer(serializers.ModelSerializer):
         fields = ('email', 'id', 'username', 'first_name',
                   'last_name', 'is_subscribed', 'recipes', 'recipes_count')
 
+    @staticmethod
+    def get_recipes_limit(request):
+        """Return the positive `recipes_limit` query parameter or None."""
+        try:
+            limit = int(request.query_params['recipes_limit'])
+        except (KeyError, ValueError):
+            return None
+        return limit if limit > 0 else None
+
+    @classmethod
+    def prefetch_recipes(cls, authors, request):
+        """Load the recipes shown for the authors in a single query."""
+        prefetch_related_objects(authors, Prefetch(
+            'recipe',
+            queryset=Recipe.objects.latest_per_author(
+                [author.id for author in authors],
+                cls.get_recipes_limit(request)),
+            to_attr='latest_recipes'))
+
+    def get_recipes(self, obj):
+        """Return the newest recipes of the author according to the limit."""
+        recipes = getattr(obj, 'latest_recipes', None)
+        if recipes is None:
+            recipes = obj.recipe.order_by('-id')[
+                :self.get_recipes_limit(self.context['request'])]
+        return RecipeSmallSerializer(
+            recipes, many=True, context=self.context).data
+
     def get_recipes_count(self, obj):
         """Return the number of recipes."""
-        return obj.recipe.count()
+        return obj.recipes_count
 
     def get_is_subscribed(self, obj):
         """Return the subscription status."""
+        if hasattr(obj, 'subscribed'):
+            return obj.subscribed
         user = self.context.get('request').user
         if user.is_authenticated:
             return Follow.objects.filter(
                 user=user.id, following=obj.id).exists()
         return False
 
-    def to_representation(self, instance):
-        """Show the number of subscriptions according to the limit."""
-        representation = super(
-            SubscribeSerializer, self).to_representation(instance)
-        query = self.context.get('request').query_params
-        if 'recipes_limit' in query:
-            limit = int(query['recipes_limit'])
-            if representation['recipes_count'] > limit:
-                representation['recipes'] = representation['recipes'][:limit]
-        return representation
-
-
-class FollowSerializer(serializers.ModelSerializer):
-    """Serialize the creation of subscriptions."""
-
-    class Meta:
-        fields = ('user', 'following')
-        model = Follow
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Follow.objects.all(),
-                fields=['user', 'following']
-            )
-        ]
-
-    def validate(self, data):
-        """Will restrict subscription creation to itself."""
-        if self.context['request'].user == data['following']:
-            raise serializers.ValidationError(
-                'Подписка на себя невозможна!')
-        return data
-
 
 class IngredientSerializer(serializers.ModelSerializer):
     """Serialization for ingredients."""
@@ -165,7 +193,7 @@ class RecipeSerializerGet(serializers.ModelSerializer):
     author = UserSerializer(required=False, read_only=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
-    image = ImageConversion()
+    image = ImageConversion(variant='detail', list_variant='card')
 
     class Meta:
         model = Recipe
@@ -175,24 +203,40 @@ class RecipeSerializerGet(serializers.ModelSerializer):
 
     def get_is_favorited(self, obj):
         """Show the recipe has been added to favorites or not."""
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
         favorite = Favorite.objects.filter(user=user.id, recipe=obj.id)
         return favorite.exists()
 
     def get_is_in_shopping_cart(self, obj):
         """Show the recipe has been added to the shopping list or not."""
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
         shopping = Shopping.objects.filter(user=user.id, recipe=obj.id)
         return shopping.exists()
 
 
+class PantryRecipeSerializer(RecipeSerializerGet):
+    """Serialization of a recipe matched with the pantry ingredients."""
+
+    coverage = serializers.FloatField(read_only=True)
+    missing_ingredients = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeSerializerGet.Meta):
+        fields = RecipeSerializerGet.Meta.fields + (
+            'coverage', 'missing_ingredients')
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     """Serialize to create and update recipe."""
 
     author = UserSerializer(required=False, read_only=True)
+    tags = PrimaryKeyListField(queryset=Tag.objects.all(), allow_empty=False)
     ingredients = IngredientAmountSerializer(
         many=True, source='recipe_to_ingredient')
-    image = ImageConversion()
+    image = ImageConversion(variant='detail')
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -205,47 +249,56 @@ class RecipeSerializer(serializers.ModelSerializer):
     def validate(self, data):
         """Check recipe creation or update data.
 
-        Are the ingredients listed.
-        Are the tags and ingredients unique.
+        Are the ingredients listed, unique, existing and with amounts > 0.
+        All ingredients are looked up with a single query and every
+        problem is reported at once. Tags are checked by their field.
+        A partial update without ingredients keeps them unchecked.
         """
-        tags = data['tags']
-        tags_list = []
-        for tags_item in tags:
-            if tags_item in tags_list:
-                raise serializers.ValidationError(
-                    'Тэги должны быть уникальными')
-            tags_list.append(tags_item)
-        ingredients = data['recipe_to_ingredient']
+        ingredients = data.get('recipe_to_ingredient')
+        if ingredients is None and self.partial:
+            return data
         if not ingredients:
             raise serializers.ValidationError({
                 'ingredients': 'Нужен хотя бы один ингредиент для рецепта'})
-        ingredient_list = []
-        for ingredient_item in ingredients:
-            ingredient = get_object_or_404(
-                Ingredient, id=ingredient_item['ingredient']['id'])
-            if ingredient in ingredient_list:
-                raise serializers.ValidationError(
-                    'Ингредиенты должны быть уникальными')
-            ingredient_list.append(ingredient)
-            if int(ingredient_item['amount']) <= 0:
-                raise serializers.ValidationError({
-                    'ingredients': ('Количества ингредиента должно быть > 0')})
+        ids = [item['ingredient']['id'] for item in ingredients]
+        errors = []
+        repeated = duplicates(ids)
+        if repeated:
+            errors.append(f'Ингредиенты должны быть уникальными: {repeated}')
+        missing = sorted(set(ids) - set(Ingredient.objects.filter(
+            id__in=ids).values_list('id', flat=True)))
+        if missing:
+            errors.append(f'Ингредиенты не найдены: {missing}')
+        not_positive = sorted(
+            item['ingredient']['id'] for item in ingredients
+            if item['amount'] <= 0)
+        if not_positive:
+            errors.append(
+                f'Количества ингредиентов должны быть > 0: {not_positive}')
+        if errors:
+            raise serializers.ValidationError({'ingredients': errors})
         return data
 
     def get_is_favorited(self, obj):
         """Show the recipe has been added to favorites or not."""
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
         favorite = Favorite.objects.filter(user=user.id, recipe=obj.id)
         return favorite.exists()
 
     def get_is_in_shopping_cart(self, obj):
         """Show the recipe has been added to the shopping list or not."""
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
         shopping = Shopping.objects.filter(user=user.id, recipe=obj.id)
         return shopping.exists()
 
     def create_ingredients(self, recipe, ingredients):
         """Create a new ingredient."""
+        if not ingredients:
+            return
         IngredientAmount.objects.bulk_create([
             IngredientAmount(
                 recipe=recipe,
@@ -263,54 +316,91 @@ class RecipeSerializer(serializers.ModelSerializer):
         recipe.tags.set(tags)
         return recipe
 
+    def update_tags(self, recipe, tags):
+        """Add and remove only the changed tags, return if any changed."""
+        new = {tag.id for tag in tags}
+        old = set(recipe.tags.values_list('id', flat=True))
+        if new == old:
+            return False
+        if old - new:
+            recipe.tags.remove(*(old - new))
+        if new - old:
+            recipe.tags.add(*(new - old))
+        return True
+
+    def update_ingredients(self, recipe, ingredients):
+        """Write only the changed ingredient rows.
+
+        Return the changes of the amounts by ingredient id.
+        """
+        amounts = {
+            ingredient['ingredient']['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        rows = {
+            row.ingredient_id: row
+            for row in IngredientAmount.objects.filter(recipe=recipe)
+        }
+        deltas = {}
+        changed = []
+        for ingredient_id, row in rows.items():
+            amount = amounts.get(ingredient_id, 0)
+            if amount != row.amount:
+                deltas[ingredient_id] = amount - row.amount
+                if amount:
+                    row.amount = amount
+                    changed.append(row)
+        removed = rows.keys() - amounts.keys()
+        added = [
+            ingredient for ingredient in ingredients
+            if ingredient['ingredient']['id'] not in rows
+        ]
+        for ingredient in added:
+            deltas[ingredient['ingredient']['id']] = ingredient['amount']
+        if removed:
+            IngredientAmount.objects.filter(
+                recipe=recipe, ingredient_id__in=removed).delete()
+        if changed:
+            IngredientAmount.objects.bulk_update(changed, ['amount'])
+        self.create_ingredients(recipe, added)
+        return deltas
+
+    @transaction.atomic
     def update(self, instance, validated_data):
-        """Update recipe."""
-        instance.tags.clear()
-        instance.tags.set(validated_data.pop('tags'))
-        IngredientAmount.objects.filter(recipe=instance).delete()
-        self.create_ingredients(
-            recipe=instance,
-            ingredients=validated_data.pop('recipe_to_ingredient')
-        )
-        super().update(instance, validated_data)
+        """Update recipe, writing only what changed.
+
+        Only the changed fields of the recipe are saved, with the `updated`
+        time, which any change of its fields, tags or ingredients sets.
+        """
+        changed = False
+        tags = validated_data.pop('tags', None)
+        if tags is not None and self.update_tags(instance, tags):
+            changed = True
+        ingredients = validated_data.pop('recipe_to_ingredient', None)
+        if ingredients is not None:
+            deltas = self.update_ingredients(instance, ingredients)
+            if deltas:
+                changed = True
+                ShoppingListItem.objects.change_recipe(instance, deltas)
+        fields = set()
+        for field, value in validated_data.items():
+            if getattr(instance, field) != value:
+                setattr(instance, field, value)
+                fields.add(field)
+        if changed or fields:
+            instance.save(update_fields=fields | {'updated'})
         return instance
 
     def to_representation(self, instance):
-        """Show a recipe with a list of tags."""
+        """Show a recipe with a list of tags.
+
+        The ingredients are loaded with their names in a single query.
+        """
+        prefetch_related_objects([instance], Prefetch(
+            'recipe_to_ingredient',
+            queryset=IngredientAmount.objects.select_related('ingredient')))
         representation = super(
             RecipeSerializer, self).to_representation(instance)
         representation['tags'] = TagSerializer(
             instance.tags, many=True, required=False).data
         return representation
-
-
-class FavoriteSerializer(serializers.ModelSerializer):
-    """Serialization when adding/deleting a recipe to favorites."""
-
-    class Meta:
-        fields = ('user', 'recipe')
-        model = Favorite
-
-    def to_representation(self, instance):
-        """Show the recipe after adding/deleting to favorites."""
-        request = self.context.get('request')
-        recipe = get_object_or_404(Recipe, id=instance.recipe_id)
-        representation = RecipeSmallSerializer(
-            recipe, context={'request': request})
-        return representation.data
-
-
-class ShoppingSerializer(serializers.ModelSerializer):
-    """Serialization when adding a recipe to the shopping list."""
-
-    class Meta:
-        fields = ('user', 'recipe')
-        model = Shopping
-
-    def to_representation(self, instance):
-        """Show the recipe after adding/deleting to the shopping list."""
-        request = self.context.get('request')
-        recipe = get_object_or_404(Recipe, id=instance.recipe_id)
-        representation = RecipeSmallSerializer(
-            recipe, context={'request': request})
-        return representation.data
@@ -0,0 +1,161 @@
+import base64
+import io
+import shutil
+import tempfile
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APITestCase
+
+from recipes.models import (Favorite, FeedEntry, Ingredient,
+                            IngredientAmount, Recipe, Shopping, Tag)
+from users.models import Follow
+
+User = get_user_model()
+
+
+def image_data(size=(1, 1), image_format='PNG', mode='RGB'):
+    """Return an image encoded as the API expects it."""
+    buffer = io.BytesIO()
+    Image.new(mode, size, 'orange').save(buffer, image_format)
+    content = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/{image_format.lower()};base64,{content}'
+
+
+class TemporaryMediaMixin:
+    """Save the uploaded files to a temporary MEDIA_ROOT of the class."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_settings.enable()
+        try:
+            super().setUpClass()
+        except Exception:
+            cls.remove_media_root()
+            raise
+
+    @classmethod
+    def remove_media_root(cls):
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            super().tearDownClass()
+        finally:
+            cls.remove_media_root()
+
+
+class SeededAPITestCase(APITestCase):
+    """Test case with a realistic dataset shared by all tests of the class.
+
+    The dataset is created once per class with bulk inserts:
+    a few hundred users, thousands of recipes with tags and ingredients,
+    thousands of subscriptions, favorites and shopping list entries.
+    """
+
+    USERS = 300
+    RECIPES_PER_USER = 10
+    INGREDIENTS = 500
+    INGREDIENTS_PER_RECIPE = 5
+    FOLLOWS_PER_USER = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        Tag.objects.bulk_create([
+            Tag(name=f'Tag {i}', color=f'#0000{i:02}', slug=f'tag{i}')
+            for i in range(4)
+        ])
+        cls.tags = list(Tag.objects.order_by('id'))
+        Ingredient.objects.bulk_create([
+            Ingredient(name=f'ingredient {i:04}', measurement_unit='г')
+            for i in range(cls.INGREDIENTS)
+        ])
+        ingredient_ids = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True))
+        User.objects.bulk_create([
+            User(email=f'user{i}@example.com', username=f'user{i}',
+                 first_name='Name', last_name='Surname')
+            for i in range(cls.USERS)
+        ])
+        users = list(User.objects.order_by('id'))
+        cls.user = users[0]
+        Recipe.objects.bulk_create([
+            Recipe(author=author, name=f'Recipe {author.id}-{i}',
+                   text='Recipe description', cooking_time=10 + i,
+                   image='api/images/recipes/image.png')
+            for author in users for i in range(cls.RECIPES_PER_USER)
+        ])
+        recipe_ids = list(
+            Recipe.objects.order_by('id').values_list('id', flat=True))
+        Recipe.tags.through.objects.bulk_create([
+            Recipe.tags.through(
+                recipe_id=recipe_id, tag_id=cls.tags[recipe_id % 4].id)
+            for recipe_id in recipe_ids
+        ])
+        IngredientAmount.objects.bulk_create([
+            IngredientAmount(
+                recipe_id=recipe_id,
+                ingredient_id=ingredient_ids[
+                    (recipe_id * 7 + i) % len(ingredient_ids)],
+                amount=i + 1)
+            for recipe_id in recipe_ids
+            for i in range(cls.INGREDIENTS_PER_RECIPE)
+        ])
+        Follow.objects.bulk_create([
+            Follow(user=user, following=users[(index + step) % len(users)])
+            for index, user in enumerate(users)
+            for step in range(1, cls.FOLLOWS_PER_USER + 1)
+        ])
+        recipes_by_author = defaultdict(list)
+        for recipe_id, author_id in Recipe.objects.values_list(
+                'id', 'author'):
+            recipes_by_author[author_id].append(recipe_id)
+        FeedEntry.objects.bulk_create([
+            FeedEntry(user_id=user, recipe_id=recipe, author_id=author)
+            for user, author in Follow.objects.values_list(
+                'user', 'following')
+            for recipe in recipes_by_author[author]
+        ])
+        Favorite.objects.bulk_create([
+            Favorite(user=cls.user, recipe_id=recipe_id)
+            for recipe_id in recipe_ids[::50]
+        ])
+        Shopping.objects.bulk_create([
+            Shopping(user=cls.user, recipe_id=recipe_id)
+            for recipe_id in recipe_ids[::100]
+        ])
+        call_command('update_counters', stdout=io.StringIO())
+        cls.recipe = Recipe.objects.order_by('id').last()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def count_queries(self, url, method='get', status=200, data_format=None,
+                      **params):
+        """Request the url and return the number of queries executed.
+
+        Savepoints are transaction control, not queries, and are not counted.
+        """
+        extra = {'format': data_format} if data_format else {}
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, params, **extra)
+            if response.streaming:
+                content = b''.join(response.streaming_content)
+            else:
+                content = response.content
+        self.assertEqual(response.status_code, status, content)
+        return len([
+            query for query in queries
+            if not query['sql'].startswith(('SAVEPOINT', 'RELEASE SAVEPOINT'))
+        ])
@@ -0,0 +1,96 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import http_date
+from rest_framework.test import APITransactionTestCase
+
+from recipes.models import Recipe
+from users.models import User
+
+
+class ConditionalRequestTests(APITransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author, self.user = [
+            User.objects.create(
+                email=f'{name}@example.com', username=name,
+                first_name='Name', last_name='Surname')
+            for name in ('author', 'user')
+        ]
+        self.recipes = [
+            Recipe.objects.create(
+                author=self.author, name=f'Recipe {i}', text='Text',
+                cooking_time=1, image='api/images/recipes/image.png')
+            for i in range(2)
+        ]
+        self.urls = (
+            reverse('api:recipes-list'),
+            reverse('api:recipes-detail', args=[self.recipes[0].id]),
+        )
+
+    def get(self, url, **headers):
+        return self.client.get(url, **headers)
+
+    def assertNotModified(self, url, etag):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # Only the query computing the ETag runs.
+        self.assertEqual(len(queries), 1)
+
+    def test_not_modified(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotModified(url, response['ETag'])
+                self.assertNotIn('Last-Modified', response)
+
+    def test_changes(self):
+        etags = [self.get(url)['ETag'] for url in self.urls]
+        recipe = self.recipes[0]
+        recipe.name = 'Renamed'
+        recipe.save()
+        for url, etag in zip(self.urls, etags):
+            response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+        # Editing the author leaves the recipes as they are.
+        etags = [self.get(url)['ETag'] for url in self.urls]
+        self.author.first_name = 'Other'
+        self.author.save()
+        for url, etag in zip(self.urls, etags):
+            response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+        etag = self.get(self.urls[0])['ETag']
+        # Deleting the older recipe leaves the newest `updated` time as is.
+        recipe.delete()
+        for headers in ({'HTTP_IF_NONE_MATCH': etag},
+                        {'HTTP_IF_MODIFIED_SINCE': http_date()}):
+            response = self.get(self.urls[0], **headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()['results']), 1)
+        self.assertEqual(self.get(self.urls[1]).status_code, 404)
+
+    def test_user_flags(self):
+        self.client.force_authenticate(self.user)
+        url = self.urls[1]
+        response = self.get(url)
+        self.assertNotIn('Last-Modified', response)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotModified(url, response['ETag'])
+        self.client.post(
+            reverse('api:recipes-favorite', args=[self.recipes[0].id]))
+        response = self.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['is_favorited'])
+        self.client.force_authenticate(self.author)
+        self.assertEqual(self.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_malformed_id(self):
+        response = self.get(
+            reverse('api:recipes-detail', args=['abc']),
+            HTTP_IF_NONE_MATCH='"etag"')
+        self.assertEqual(response.status_code, 404)
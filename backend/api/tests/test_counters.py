@@ -0,0 +1,111 @@
+import io
+
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from recipes.models import Favorite, Ingredient, Recipe, Tag
+from users.models import Follow, User
+from .base import TemporaryMediaMixin, image_data
+
+
+class CounterTests(TemporaryMediaMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            email='author@example.com', username='author',
+            first_name='Name', last_name='Surname')
+        cls.user = User.objects.create(
+            email='user@example.com', username='user',
+            first_name='Name', last_name='Surname')
+        cls.tag = Tag.objects.create(name='Tag', color='#000000', slug='tag')
+        cls.ingredient = Ingredient.objects.create(
+            name='соль', measurement_unit='г')
+
+    def create_recipe(self):
+        self.client.force_authenticate(self.author)
+        response = self.client.post(reverse('api:recipes-list'), {
+            'tags': [self.tag.id],
+            'ingredients': [{'id': self.ingredient.id, 'amount': 1}],
+            'name': 'Recipe', 'text': 'Text', 'cooking_time': 1,
+            'image': image_data()
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return Recipe.objects.get(id=response.data['id'])
+
+    def test_recipe_counters(self):
+        recipe = self.create_recipe()
+        self.client.force_authenticate(self.user)
+        self.client.post(reverse('api:recipes-favorite', args=[recipe.id]))
+        self.client.post(
+            reverse('api:recipes-shopping-cart', args=[recipe.id]))
+        recipe.refresh_from_db()
+        self.assertEqual(
+            (recipe.favorites_count, recipe.in_carts_count), (1, 1))
+        self.client.delete(reverse('api:recipes-favorite', args=[recipe.id]))
+        recipe.refresh_from_db()
+        self.assertEqual(
+            (recipe.favorites_count, recipe.in_carts_count), (0, 1))
+
+    def test_user_counters(self):
+        recipe = self.create_recipe()
+        self.client.force_authenticate(self.user)
+        self.client.post(reverse('api:user-subscribe', args=[self.author.id]))
+        self.author.refresh_from_db()
+        self.assertEqual(
+            (self.author.recipes_count, self.author.followers_count), (1, 1))
+        self.client.delete(
+            reverse('api:user-subscribe', args=[self.author.id]))
+        self.client.force_authenticate(self.author)
+        self.client.delete(reverse('api:recipes-detail', args=[recipe.id]))
+        self.author.refresh_from_db()
+        self.assertEqual(
+            (self.author.recipes_count, self.author.followers_count), (0, 0))
+
+    def test_update_counters_command(self):
+        recipe = Recipe.objects.create(
+            author=self.author, name='Recipe', text='Text', cooking_time=1)
+        Favorite.objects.create(user=self.user, recipe=recipe)
+        Follow.objects.create(user=self.user, following=self.author)
+        call_command('update_counters', stdout=io.StringIO())
+        recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(
+            (recipe.favorites_count, recipe.in_carts_count), (1, 0))
+        self.assertEqual(
+            (self.author.recipes_count, self.author.followers_count), (1, 1))
+
+    def test_repeated_toggles(self):
+        recipe = self.create_recipe()
+        self.client.force_authenticate(self.user)
+        for name in ('api:recipes-favorite', 'api:recipes-shopping-cart'):
+            url = reverse(name, args=[recipe.id])
+            with self.subTest(url=url):
+                self.assertEqual(self.client.post(url).status_code, 201)
+                self.assertEqual(self.client.post(url).status_code, 400)
+                self.assertEqual(self.client.delete(url).status_code, 204)
+                self.assertEqual(self.client.delete(url).status_code, 400)
+                missing = reverse(name, args=[recipe.id + 1])
+                self.assertEqual(self.client.post(missing).status_code, 400)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 0)
+        self.assertEqual(recipe.in_carts_count, 0)
+
+        url = reverse('api:user-subscribe', args=[self.author.id])
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(response.data['is_subscribed'])
+        self.assertEqual(response.data['recipes_count'], 1)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 1)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 400)
+        self.assertEqual(self.client.post(reverse(
+            'api:user-subscribe', args=[self.user.id])).status_code, 400)
+        self.assertEqual(self.client.post(reverse(
+            'api:user-subscribe', args=[9999])).status_code, 404)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 0)
+        self.assertFalse(Follow.objects.exists())
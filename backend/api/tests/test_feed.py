@@ -0,0 +1,96 @@
+
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITransactionTestCase
+
+from recipes.models import FeedEntry, Ingredient, Recipe, Tag
+from users.models import User
+from .base import TemporaryMediaMixin, image_data
+
+
+@override_settings(RECIPE_IMAGE_FORMAT='JPEG',
+                   FEED_FANOUT_MAX_FOLLOWERS=2, FEED_BACKFILL=2)
+class FeedTests(TemporaryMediaMixin, APITransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.users = [
+            User.objects.create(
+                email=f'user{i}@example.com', username=f'user{i}',
+                first_name='Name', last_name='Surname')
+            for i in range(4)
+        ]
+        self.reader, self.other, self.author, self.star = self.users
+        self.tag = Tag.objects.create(name='Tag', color='#000000', slug='tag')
+        self.ingredient = Ingredient.objects.create(
+            name='соль', measurement_unit='г')
+        self.old_recipes = [
+            Recipe.objects.create(
+                author=author, name=f'Old {i}', text='Text', cooking_time=1,
+                image='api/images/recipes/image.png')
+            for author in (self.author, self.star) for i in range(3)
+        ]
+
+    def subscribe(self, user, author, method='post'):
+        self.client.force_authenticate(user)
+        response = getattr(self.client, method)(
+            reverse('api:user-subscribe', args=[author.id]))
+        self.assertIn(response.status_code, (201, 204))
+
+    def create_recipe(self, author, name):
+        self.client.force_authenticate(author)
+        response = self.client.post(reverse('api:recipes-list'), {
+            'tags': [self.tag.id],
+            'ingredients': [{'id': self.ingredient.id, 'amount': 1}],
+            'name': name, 'text': 'Text', 'cooking_time': 1,
+            'image': image_data()
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def feed(self, user, **params):
+        self.client.force_authenticate(user)
+        response = self.client.get(reverse('api:recipes-feed'), params)
+        self.assertEqual(response.status_code, 200)
+        return [recipe['name'] for recipe in response.json()['results']]
+
+    def test_subscribing_fills_the_feed(self):
+        self.subscribe(self.reader, self.author)
+        # Only the FEED_BACKFILL recent recipes are copied.
+        self.assertEqual(self.feed(self.reader), ['Old 2', 'Old 1'])
+        self.create_recipe(self.author, 'New')
+        self.assertEqual(
+            self.feed(self.reader), ['New', 'Old 2', 'Old 1'])
+        self.assertEqual(self.feed(self.other), [])
+
+    def test_unsubscribing_empties_the_feed(self):
+        self.subscribe(self.reader, self.author)
+        self.subscribe(self.reader, self.author, 'delete')
+        self.assertEqual(self.feed(self.reader), [])
+        self.assertFalse(FeedEntry.objects.exists())
+
+    def test_popular_authors_are_pulled(self):
+        self.subscribe(self.other, self.star)
+        self.subscribe(self.reader, self.star)
+        self.create_recipe(self.star, 'New')
+        # The second follower reached the fan-out limit: nothing is copied
+        # for them, the recipes of the author are read instead.
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(
+            self.feed(self.reader), ['New', 'Old 2', 'Old 1', 'Old 0'])
+        self.subscribe(self.reader, self.star, 'delete')
+        self.assertEqual(self.feed(self.reader), [])
+        # Back under the limit, the remaining follower gets a full feed.
+        self.assertEqual(
+            self.feed(self.other), ['New', 'Old 2', 'Old 1'])
+
+    def test_pagination(self):
+        self.subscribe(self.reader, self.author)
+        self.create_recipe(self.author, 'New')
+        self.assertEqual(self.feed(self.reader, limit=1), ['New'])
+        self.assertEqual(
+            self.feed(self.reader, limit=1, cursor=''), ['New'])
+
+    def test_requires_authentication(self):
+        response = self.client.get(reverse('api:recipes-feed'))
+        self.assertEqual(response.status_code, 401)
@@ -0,0 +1,54 @@
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from recipes.models import Recipe, Tag
+from users.models import User
+
+
+class TagFilterTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(
+            email='cook@example.com', username='cook',
+            first_name='Name', last_name='Surname')
+        cls.breakfast = Tag.objects.create(
+            name='Завтрак', color='#000001', slug='breakfast')
+        cls.lunch = Tag.objects.create(
+            name='Обед', color='#000002', slug='lunch')
+        cls.recipes = []
+        for tags in ([cls.breakfast, cls.lunch], [cls.lunch], []):
+            recipe = Recipe.objects.create(
+                author=author, name='Рецепт', text='Текст', cooking_time=1,
+                image='api/images/recipes/image.png')
+            recipe.tags.set(tags)
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        cache.clear()
+
+    def filter(self, *tags):
+        response = self.client.get(
+            reverse('api:recipes-list'), {'tags': tags})
+        return response
+
+    def test_any_tag_without_duplicates(self):
+        response = self.filter('breakfast', 'lunch')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 2)
+        self.assertEqual(
+            [recipe['id'] for recipe in response.json()['results']],
+            [self.recipes[1].id, self.recipes[0].id])
+
+    def test_unknown_tag(self):
+        self.assertEqual(self.filter('dinner').status_code, 400)
+
+    def test_tag_changes(self):
+        self.assertEqual(self.filter('breakfast').json()['count'], 1)
+        self.breakfast.slug = 'morning'
+        self.breakfast.save()
+        # Cached responses are invalidated when the transaction commits.
+        cache.clear()
+        self.assertEqual(self.filter('morning').json()['count'], 1)
+        self.assertEqual(self.filter('breakfast').status_code, 400)
@@ -0,0 +1,170 @@
+import base64
+import json
+from unittest import mock
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework.test import APITestCase
+
+from recipes.images import process_recipe_image, variant_name
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+from .base import TemporaryMediaMixin, image_data
+
+
+@override_settings(RECIPE_IMAGE_FORMAT='JPEG')
+class RecipeImageTests(TemporaryMediaMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            email='cook@example.com', username='cook',
+            first_name='Name', last_name='Surname')
+        cls.tag = Tag.objects.create(name='Tag', color='#000000', slug='tag')
+        cls.ingredient = Ingredient.objects.create(
+            name='соль', measurement_unit='г')
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def create_recipe(self, image):
+        return self.client.post(reverse('api:recipes-list'), {
+            'tags': [self.tag.id],
+            'ingredients': [{'id': self.ingredient.id, 'amount': 1}],
+            'name': 'Recipe', 'text': 'Text', 'cooking_time': 1,
+            'image': image,
+        }, format='json')
+
+    def test_invalid_images(self):
+        for image in ('data:image/png;base64,iVBORw0KGgo=',
+                      'data:image/png;base64,!!!', 'not an image',
+                      image_data(image_format='BMP')):
+            with self.subTest(image=image[:30]):
+                response = self.create_recipe(image)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('image', response.data)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_line_breaks(self):
+        image = image_data(size=(40, 40))
+        header, content = image.split(',')
+        decoded = base64.b64decode(content)
+        lines = base64.encodebytes(decoded).decode()
+        # Chunks not aligned on the lines nor on 4 characters, and a size
+        # limit the whitespace would exceed.
+        with mock.patch('api.fields.BASE64_CHUNK_SIZE', 30), \
+                override_settings(RECIPE_IMAGE_MAX_SIZE=len(decoded)):
+            response = self.create_recipe(f'{header},{lines}')
+        self.assertEqual(response.status_code, 201, response.data)
+
+    @override_settings(RECIPE_IMAGE_MAX_SIZE=10)
+    def test_size_limit(self):
+        response = self.create_recipe(image_data())
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('larger', str(response.data['image']))
+
+    def test_type_from_content(self):
+        image = image_data(image_format='GIF').replace(
+            'data:image/gif', 'data:image/jpeg')
+        response = self.create_recipe(image)
+        self.assertEqual(response.status_code, 201, response.data)
+        recipe = Recipe.objects.get(id=response.data['id'])
+        self.assertTrue(recipe.image.name.endswith('.gif'))
+
+    def test_variants(self):
+        response = self.create_recipe(image_data((2000, 1000), 'PNG', 'RGBA'))
+        self.assertEqual(response.status_code, 201, response.data)
+        recipe = Recipe.objects.get(id=response.data['id'])
+        self.assertFalse(recipe.thumbnails_ready)
+        self.assertTrue(recipe.image.name.endswith('.png'))
+        self.assertEqual(response.data['image'], recipe.image.url)
+
+        process_recipe_image(recipe.id, recipe.image.name)
+        recipe.refresh_from_db()
+        self.assertTrue(recipe.thumbnails_ready)
+        for variant, size in (('detail', (1280, 640)), ('card', (640, 320)),
+                              ('preview', (240, 120))):
+            with default_storage.open(
+                    variant_name(recipe.image.name, variant)) as file:
+                with Image.open(file) as image:
+                    self.assertEqual(image.format, 'JPEG')
+                    self.assertEqual(image.size, size)
+
+        def url(variant):
+            return default_storage.url(
+                variant_name(recipe.image.name, variant))
+
+        response = self.client.get(reverse('api:recipes-list'))
+        self.assertEqual(response.data['results'][0]['image'], url('card'))
+        response = self.client.get(
+            reverse('api:recipes-detail', args=[recipe.id]))
+        self.assertEqual(response.data['image'], url('detail'))
+        response = self.client.post(
+            reverse('api:recipes-favorite', args=[recipe.id]))
+        self.assertEqual(response.data['image'], url('preview'))
+
+    def test_new_image_resets_variants(self):
+        recipe = Recipe.objects.get(
+            id=self.create_recipe(image_data()).data['id'])
+        old_image = recipe.image.name
+        Recipe.objects.filter(id=recipe.id).update(thumbnails_ready=True)
+        response = self.client.patch(
+            reverse('api:recipes-detail', args=[recipe.id]), {
+                'tags': [self.tag.id],
+                'ingredients': [{'id': self.ingredient.id, 'amount': 1}],
+                'name': 'Recipe', 'text': 'Text', 'cooking_time': 1,
+                'image': image_data(image_format='JPEG'),
+            }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        recipe.refresh_from_db()
+        self.assertFalse(recipe.thumbnails_ready)
+        self.assertTrue(recipe.image.name.endswith('.jpeg'))
+
+        # A late job for the previous image does not mark the new one ready.
+        process_recipe_image(recipe.id, old_image)
+        self.assertFalse(Recipe.objects.get(id=recipe.id).thumbnails_ready)
+
+    def multipart(self, image, method='post', url=None, **fields):
+        content = base64.b64decode(image.split(';base64,')[1])
+        data = {
+            'tags': json.dumps([self.tag.id]),
+            'ingredients': json.dumps(
+                [{'id': self.ingredient.id, 'amount': 2}]),
+            'name': 'Recipe', 'text': 'Text', 'cooking_time': 1,
+            'image': SimpleUploadedFile(
+                'photo.jpg', content, content_type='image/jpeg'),
+            **fields,
+        }
+        return getattr(self.client, method)(
+            url or reverse('api:recipes-list'), data, format='multipart')
+
+    def test_multipart_upload(self):
+        response = self.multipart(image_data(image_format='PNG'))
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['ingredients'][0]['amount'], 2)
+        recipe = Recipe.objects.get(id=response.data['id'])
+        self.assertTrue(recipe.image.name.endswith('.png'))
+        self.assertEqual(list(recipe.tags.all()), [self.tag])
+
+        response = self.multipart(
+            image_data(image_format='GIF'), 'patch',
+            reverse('api:recipes-detail', args=[recipe.id]), name='New')
+        self.assertEqual(response.status_code, 200, response.data)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, 'New')
+        self.assertTrue(recipe.image.name.endswith('.gif'))
+
+    def test_multipart_invalid(self):
+        response = self.multipart(image_data(), tags='[1,')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('tags', response.data['detail'])
+        response = self.multipart('data:image/png;base64,iVBORw0KGgo=')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
+        with override_settings(RECIPE_IMAGE_MAX_SIZE=10):
+            response = self.multipart(image_data())
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Recipe.objects.exists())
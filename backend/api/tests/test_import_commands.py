@@ -0,0 +1,87 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from recipes.models import Ingredient, Tag
+
+INGREDIENTS = [
+    ('соль', 'г'),
+    ('сахар', 'г'),
+    ('молоко', 'мл'),
+    ('соль', 'г'),
+]
+
+
+class ImportCommandTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def call(self, command, *args, err=None):
+        out = io.StringIO()
+        call_command(command, *args, stdout=out, stderr=err or io.StringIO())
+        return out.getvalue()
+
+    def test_csv_import_is_idempotent(self):
+        path = self.write(
+            'ingredients.csv',
+            ''.join(f'{name},{unit}\n' for name, unit in INGREDIENTS))
+        out = self.call('add_ingredients', '--path', path, '--batch-size', '2')
+        self.assertIn('Read 4 rows, created 3', out)
+        out = self.call('add_ingredients', '--path', path)
+        self.assertIn('Read 4 rows, created 0', out)
+        self.assertEqual(
+            set(Ingredient.objects.values_list('name', 'measurement_unit')),
+            set(INGREDIENTS))
+
+    def test_json_import(self):
+        path = self.write('ingredients.json', json.dumps([
+            {'name': name, 'measurement_unit': unit}
+            for name, unit in INGREDIENTS], ensure_ascii=False, indent=2))
+        out = self.call('add_ingredients', '--path', path)
+        self.assertIn('Read 4 rows, created 3', out)
+        self.assertEqual(Ingredient.objects.count(), 3)
+
+    def test_format_option_overrides_extension(self):
+        path = self.write(
+            'tags.txt', '[{"name": "Обед", "color": "#DC143C", '
+                        '"slug": "lunch"}]')
+        self.call('add_tags', '--path', path, '--format', 'json')
+        self.assertTrue(Tag.objects.filter(slug='lunch').exists())
+
+    def test_invalid_files(self):
+        truncated = self.write('broken.json', '[{"name": "соль", ')
+        missing_field = self.write('tags.json', '[{"name": "Обед"}]')
+        for command, path in (
+                ('add_ingredients', truncated),
+                ('add_tags', missing_field),
+                ('add_tags', os.path.join(self.directory, 'missing.csv'))):
+            with self.subTest(path=path), self.assertRaises(CommandError):
+                self.call(command, '--path', path)
+        self.assertFalse(Tag.objects.exists())
+
+    def test_warns_about_a_cache_local_to_the_process(self):
+        path = self.write('ingredients.csv', 'соль,г\n')
+        err = io.StringIO()
+        self.call('add_ingredients', '--path', path, err=err)
+        self.assertIn('CACHE_BACKEND', err.getvalue())
+        Ingredient.objects.all().delete()
+        err = io.StringIO()
+        with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.'
+                           'FileBasedCache',
+                'LOCATION': self.directory}}):
+            self.call('add_ingredients', '--path', path, err=err)
+        self.assertEqual(err.getvalue(), '')
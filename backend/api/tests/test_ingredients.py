@@ -0,0 +1,122 @@
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from recipes.models import Ingredient, Tag
+
+
+class IngredientSearchTests(APITestCase):
+
+    url = reverse('api:ingredients-list')
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create([
+            Ingredient(name=name, measurement_unit='г') for name in (
+                'сахарная пудра', 'ванильный сахар', 'сахар', 'соль',
+                'тростниковый сахар', 'мука')
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return [ingredient['name'] for ingredient in response.json()]
+
+    def test_prefix_matches_first(self):
+        expected = ['сахар', 'сахарная пудра',
+                    'ванильный сахар', 'тростниковый сахар']
+        self.assertEqual(self.search(name='сах'), expected)
+        with override_settings(INGREDIENT_SEARCH_IN_MEMORY=False):
+            self.assertEqual(self.search(name='сах'), expected)
+
+    def test_case_insensitive(self):
+        self.assertEqual(
+            self.search(name='САХАРН'), ['сахарная пудра'])
+
+    def test_short_query(self):
+        self.assertEqual(self.search(name='с'), [
+            'сахар', 'сахарная пудра', 'соль',
+            'ванильный сахар', 'тростниковый сахар'])
+
+    def test_limit(self):
+        self.assertEqual(
+            self.search(name='сахар', limit=2), ['сахар', 'сахарная пудра'])
+        with override_settings(INGREDIENT_SEARCH_IN_MEMORY=False):
+            self.assertEqual(
+                self.search(name='сахар', limit=2),
+                ['сахар', 'сахарная пудра'])
+
+    def test_no_matches(self):
+        self.assertEqual(self.search(name='перец'), [])
+
+    def test_list_without_search(self):
+        self.assertEqual(len(self.search()), 6)
+
+    def test_index_is_reloaded_on_change(self):
+        self.assertEqual(self.search(name='перец'), [])
+        Ingredient.objects.create(name='перец', measurement_unit='г')
+        self.assertEqual(self.search(name='перец'), ['перец'])
+
+
+class ReferenceDataCacheTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ingredient = Ingredient.objects.create(
+            name='соль', measurement_unit='г')
+        cls.tag = Tag.objects.create(
+            name='Обед', color='#DC143C', slug='lunch')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_list_is_cached(self):
+        url = reverse('api:ingredients-list')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [
+            {'id': self.ingredient.id, 'name': 'соль',
+             'measurement_unit': 'г'}])
+        # Only the rows are counted.
+        with self.assertNumQueries(1):
+            cached = self.client.get(url)
+        self.assertEqual(cached.content, response.content)
+
+    def test_not_modified(self):
+        for url in (reverse('api:tags-list'),
+                    reverse('api:tags-detail', args=[self.tag.id]),
+                    reverse('api:ingredients-list'),
+                    reverse('api:ingredients-list') + '?name=со'):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+
+    def test_change_invalidates(self):
+        url = reverse('api:tags-list')
+        etag = self.client.get(url)['ETag']
+        Tag.objects.create(name='Ужин', color='#1E90FF', slug='dinner')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()), 2)
+
+    def test_change_from_another_process(self):
+        url = reverse('api:ingredients-list')
+        etag = self.client.get(url)['ETag']
+        # Rows added without signals, as if by a process whose version
+        # stamps are not shared with this one.
+        Ingredient.objects.bulk_create([
+            Ingredient(name='сахар', measurement_unit='г'),
+            Ingredient(name='мука', measurement_unit='г'),
+        ])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 3)
+        Ingredient.objects.filter(name='мука').delete()
+        self.assertEqual(len(self.client.get(url).json()), 2)
@@ -0,0 +1,53 @@
+from django.urls import reverse
+
+from .base import SeededAPITestCase
+
+
+class CursorPaginationTests(SeededAPITestCase):
+
+    def walk(self, url, **params):
+        """Follow the `next` links and return the pages."""
+        pages = []
+        response = self.client.get(url, {'cursor': '', **params})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            self.assertNotIn('count', data)
+            pages.append(data)
+            if data['next'] is None:
+                return pages
+            response = self.client.get(data['next'])
+
+    def test_recipe_feed(self):
+        url = reverse('api:recipes-list')
+        pages = self.walk(url, limit=500, author=self.recipe.author_id)
+        ids = [recipe['id'] for page in pages for recipe in page['results']]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        self.assertEqual(len(ids), 10)
+
+        pages = self.walk(url, limit=400)
+        ids = [recipe['id'] for page in pages for recipe in page['results']]
+        self.assertEqual(len(pages), 8)
+        self.assertEqual(ids, sorted(set(ids), reverse=True))
+        self.assertEqual(len(ids), 3000)
+
+    def test_previous_page(self):
+        url = reverse('api:recipes-list')
+        first = self.client.get(url, {'cursor': '', 'limit': 3}).json()
+        second = self.client.get(first['next']).json()
+        self.assertIsNone(first['previous'])
+        self.assertEqual(
+            self.client.get(second['previous']).json()['results'],
+            first['results'])
+
+    def test_subscriptions(self):
+        pages = self.walk(reverse('api:user-subscriptions'), limit=3)
+        ids = [user['id'] for page in pages for user in page['results']]
+        self.assertEqual(len(ids), 10)
+        self.assertEqual(ids, sorted(ids))
+
+    def test_page_numbers_unchanged(self):
+        data = self.client.get(
+            reverse('api:recipes-list'), {'page': 2, 'limit': 5}).json()
+        self.assertEqual(data['count'], 3000)
+        self.assertEqual(len(data['results']), 5)
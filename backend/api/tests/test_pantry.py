@@ -0,0 +1,83 @@
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from recipes.models import Ingredient, IngredientAmount, Recipe
+from recipes.pantry import pantry_index, record_change
+from users.models import User
+
+RECIPES = (
+    ('Борщ', ('свекла', 'капуста', 'картофель', 'морковь')),
+    ('Винегрет', ('свекла', 'картофель', 'морковь')),
+    ('Щи', ('капуста', 'картофель')),
+    ('Оладьи', ('мука', 'кефир')),
+)
+
+
+class PantryTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            email='cook@example.com', username='cook',
+            first_name='Name', last_name='Surname')
+        cls.ingredients = {}
+        cls.recipes = {}
+        for name, ingredients in RECIPES:
+            recipe = Recipe.objects.create(
+                author=cls.author, name=name, text=name, cooking_time=1,
+                image='api/images/recipes/image.png')
+            for ingredient in ingredients:
+                if ingredient not in cls.ingredients:
+                    cls.ingredients[ingredient] = Ingredient.objects.create(
+                        name=ingredient, measurement_unit='г')
+                IngredientAmount.objects.create(
+                    recipe=recipe, amount=1,
+                    ingredient=cls.ingredients[ingredient])
+            cls.recipes[name] = recipe
+
+    def setUp(self):
+        # Test data is rolled back without committing, the cache is cleared
+        # to reload the pantry index.
+        cache.clear()
+
+    def pantry(self, *names, **params):
+        response = self.client.get(reverse('api:recipes-pantry'), {
+            'ingredients': [self.ingredients[name].id for name in names],
+            **params})
+        self.assertEqual(response.status_code, 200)
+        return [(recipe['name'], recipe['coverage'],
+                 recipe['missing_ingredients'])
+                for recipe in response.json()]
+
+    def test_ranked_by_coverage(self):
+        self.assertEqual(self.pantry('картофель', 'капуста', 'свекла'), [
+            ('Щи', 1.0, 0),
+            ('Борщ', 0.75, 1),
+            ('Винегрет', 0.6667, 1),
+        ])
+
+    def test_limit(self):
+        self.assertEqual(
+            self.pantry('картофель', 'капуста', limit=1), [('Щи', 1.0, 0)])
+
+    def test_invalid_query(self):
+        url = reverse('api:recipes-pantry')
+        for params in ({}, {'ingredients': 'x'}, {'ingredients': 1,
+                                                  'limit': 0}):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_index_follows_changes(self):
+        self.assertEqual(self.pantry('мука'), [('Оладьи', 0.5, 1)])
+        recipe = self.recipes['Оладьи']
+        IngredientAmount.objects.filter(
+            recipe=recipe, ingredient=self.ingredients['кефир']).delete()
+        # Changes are recorded when the transaction commits.
+        record_change(recipe.id)
+        with self.assertNumQueries(1):
+            pantry_index.match([self.ingredients['мука'].id])
+        self.assertEqual(self.pantry('мука'), [('Оладьи', 1.0, 0)])
+        recipe.delete()
+        record_change(recipe.id)
+        self.assertEqual(self.pantry('мука'), [])
@@ -0,0 +1,129 @@
+from django.urls import reverse
+
+from recipes.models import Recipe
+from .base import SeededAPITestCase
+
+
+class QueryBudgetTests(SeededAPITestCase):
+    """Every endpoint is served within a fixed number of queries.
+
+    The budget must not depend on the page size or on the amount of data,
+    so each list endpoint is also requested with a small and a large page.
+    """
+
+    def assertQueryBudget(self, url, budget, **params):
+        queries = self.count_queries(url, **params)
+        self.assertLessEqual(
+            queries, budget, f'{url} {params}: {queries} > {budget} queries')
+        return queries
+
+    def assertFlatInPageSize(self, url, budget, **params):
+        small = self.assertQueryBudget(url, budget, limit=1, **params)
+        large = self.assertQueryBudget(url, budget, limit=50, **params)
+        self.assertEqual(
+            small, large, f'{url}: queries grow with the page size')
+
+    def test_recipe_list(self):
+        # One of the queries computes the ETag.
+        self.assertFlatInPageSize(reverse('api:recipes-list'), 7)
+
+    def test_recipe_list_anonymous(self):
+        self.client.force_authenticate(None)
+        self.assertFlatInPageSize(reverse('api:recipes-list'), 7)
+
+    def test_recipe_list_filtered(self):
+        url = reverse('api:recipes-list')
+        # The first request caches the tag ids.
+        self.client.get(url, {'tags': ['tag1']})
+        self.assertFlatInPageSize(url, 7, tags=['tag1', 'tag2'])
+        self.assertFlatInPageSize(url, 7, is_favorited=1)
+        self.assertFlatInPageSize(url, 7, is_in_shopping_cart=1)
+        self.assertFlatInPageSize(url, 7, author=self.recipe.author_id)
+
+    def test_feed(self):
+        url = reverse('api:recipes-feed')
+        self.assertFlatInPageSize(url, 7)
+        self.assertFlatInPageSize(url, 6, cursor='')
+
+    def test_recipe_list_cursor(self):
+        # Keyset pagination skips the count query.
+        self.assertFlatInPageSize(reverse('api:recipes-list'), 6, cursor='')
+
+    def test_cached_recipes(self):
+        # Cached responses only compute the ETag and fetch the flags
+        # of the current user.
+        for url in (reverse('api:recipes-list'),
+                    reverse('api:recipes-detail', args=[self.recipe.id])):
+            with self.subTest(url=url):
+                self.client.get(url)
+                self.assertQueryBudget(url, 2)
+                self.client.force_authenticate(None)
+                self.assertQueryBudget(url, 1)
+                self.client.force_authenticate(self.user)
+
+    def test_recipe_detail(self):
+        self.assertQueryBudget(
+            reverse('api:recipes-detail', args=[self.recipe.id]), 6)
+
+    def test_subscriptions(self):
+        url = reverse('api:user-subscriptions')
+        self.assertFlatInPageSize(url, 3)
+        self.assertFlatInPageSize(url, 3, recipes_limit=3)
+
+    def test_user_list(self):
+        self.assertFlatInPageSize(reverse('api:user-list'), 2)
+
+    def test_ingredient_search(self):
+        url = reverse('api:ingredients-list')
+        # The rows are counted for the ETag, then listed.
+        self.assertQueryBudget(url, 2)
+        self.assertQueryBudget(url, 2, name='ingredient 01')
+
+    def test_pantry(self):
+        url = reverse('api:recipes-pantry')
+        ingredients = list(range(1, 21))
+        # The first request loads the index.
+        self.client.get(url, {'ingredients': ingredients})
+        self.assertFlatInPageSize(url, 5, ingredients=ingredients)
+
+    def test_tag_list(self):
+        self.assertQueryBudget(reverse('api:tags-list'), 2)
+
+    def test_toggles(self):
+        recipe = self.recipe.id - 1
+        author = self.recipe.author_id
+        # Rows deleted with signal receivers are fetched first.
+        budgets = (
+            (reverse('api:recipes-favorite', args=[recipe]), 4, 4),
+            (reverse('api:recipes-shopping-cart', args=[recipe]), 8, 8),
+            (reverse('api:user-subscribe', args=[author]), 6, 5),
+        )
+        for url, post_budget, delete_budget in budgets:
+            with self.subTest(url=url):
+                self.assertLessEqual(
+                    self.count_queries(url, 'post', 201), post_budget)
+                self.assertLessEqual(
+                    self.count_queries(url, 'delete', 204), delete_budget)
+
+    def test_batch_toggles(self):
+        ids = list(Recipe.objects.filter(
+            favorites_count=0, in_carts_count=0).values_list(
+                'id', flat=True)[:20])
+        budgets = (
+            ('api:recipes-favorite-batch', 5, 5),
+            ('api:recipes-shopping-cart-batch', 10, 10),
+        )
+        for name, post_budget, delete_budget in budgets:
+            url = reverse(name)
+            with self.subTest(url=url):
+                self.assertLessEqual(self.count_queries(
+                    url, 'post', data_format='json', ids=ids), post_budget)
+                self.assertLessEqual(self.count_queries(
+                    url, 'delete', data_format='json', ids=ids),
+                    delete_budget)
+        self.assertLessEqual(self.count_queries(
+            reverse('api:recipes-clear-shopping-cart'), 'delete', 204), 5)
+
+    def test_download_shopping_cart(self):
+        self.assertQueryBudget(
+            reverse('api:recipes-download-shopping-cart'), 1)
@@ -0,0 +1,163 @@
+import re
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from api.serializers import RecipeSerializer
+from recipes.models import Ingredient, IngredientAmount, Recipe, Tag
+from users.models import User
+from .base import TemporaryMediaMixin, image_data
+
+
+class RecipeWriteTests(TemporaryMediaMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            email='cook@example.com', username='cook',
+            first_name='Name', last_name='Surname')
+        Tag.objects.bulk_create([
+            Tag(name=f'Tag {i}', color=f'#00000{i}', slug=f'tag{i}')
+            for i in range(3)
+        ])
+        Ingredient.objects.bulk_create([
+            Ingredient(name=f'ingredient {i:02}', measurement_unit='г')
+            for i in range(40)
+        ])
+        cls.tags = list(Tag.objects.order_by('id'))
+        cls.ingredients = list(Ingredient.objects.order_by('id'))
+        cls.image = image_data()
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def create_recipe(self, ingredients, tags=None):
+        return self.client.post(reverse('api:recipes-list'), {
+            'tags': [tag.id for tag in self.tags] if tags is None else tags,
+            'ingredients': ingredients,
+            'name': 'Recipe', 'text': 'Text', 'cooking_time': 1,
+            'image': self.image,
+        }, format='json')
+
+    def amounts(self, count):
+        return [{'id': ingredient.id, 'amount': 1}
+                for ingredient in self.ingredients[:count]]
+
+    def test_queries_do_not_grow_with_ingredients(self):
+        queries = []
+        for count in (1, 40):
+            with CaptureQueriesContext(connection) as captured:
+                response = self.create_recipe(self.amounts(count))
+            self.assertEqual(response.status_code, 201, response.data)
+            queries.append(len([
+                query for query in captured
+                if not query['sql'].startswith(
+                    ('SAVEPOINT', 'RELEASE SAVEPOINT'))
+            ]))
+        self.assertEqual(queries[0], queries[1])
+
+    def test_all_ingredient_errors_reported(self):
+        first, second = self.ingredients[:2]
+        response = self.create_recipe([
+            {'id': first.id, 'amount': 1},
+            {'id': first.id, 'amount': 2},
+            {'id': second.id, 'amount': 0},
+            {'id': 9999, 'amount': 1},
+            {'id': 9998, 'amount': 1},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['ingredients'], [
+            f'Ингредиенты должны быть уникальными: [{first.id}]',
+            'Ингредиенты не найдены: [9998, 9999]',
+            f'Количества ингредиентов должны быть > 0: [{second.id}]',
+        ])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_tag_errors(self):
+        tag = self.tags[0]
+        for tags, errors in (
+                ([tag.id, tag.id], [f'уникальными: [{tag.id}]']),
+                ([tag.id, 9999, 9998], ['не найдены: [9998, 9999]']),
+                ([tag.id, 9999, tag.id],
+                 [f'уникальными: [{tag.id}]', 'не найдены: [9999]']),
+                ([], ['may not be empty'])):
+            with self.subTest(tags=tags):
+                response = self.create_recipe(self.amounts(1), tags)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(len(response.data['tags']), len(errors))
+                for message, expected in zip(response.data['tags'], errors):
+                    self.assertIn(expected, message)
+        self.assertFalse(Recipe.objects.exists())
+
+    def update(self, recipe, **changes):
+        data = {
+            'tags': [tag.id for tag in recipe.tags.all()],
+            'ingredients': [
+                {'id': row.ingredient_id, 'amount': row.amount}
+                for row in recipe.recipe_to_ingredient.all()
+            ],
+            'name': recipe.name, 'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            **changes,
+        }
+        serializer = RecipeSerializer(
+            recipe, data=data, partial=True, context={'request': None})
+        serializer.is_valid(raise_exception=True)
+        with CaptureQueriesContext(connection) as captured:
+            serializer.save()
+        writes = []
+        for query in captured:
+            sql = query['sql']
+            if not sql.startswith(('INSERT', 'UPDATE', 'DELETE')):
+                continue
+            write = ' '.join(sql.split()[:3])
+            if sql.startswith('UPDATE "recipes_recipe" '):
+                write += ' ' + ', '.join(sorted(re.findall(
+                    r'"(\w+)" = ', sql.split(' WHERE ')[0])))
+            writes.append(write)
+        return writes
+
+    def test_update_writes_only_changes(self):
+        recipe = Recipe.objects.get(
+            id=self.create_recipe(self.amounts(5)).data['id'])
+        self.assertEqual(self.update(recipe), [])
+
+        ingredients = self.amounts(5)
+        ingredients[0]['amount'] = 3
+        # The recipe only gets its new `updated` time.
+        self.assertEqual(self.update(recipe, ingredients=ingredients), [
+            'UPDATE "recipes_ingredientamount" SET',
+            'UPDATE "recipes_recipe" SET updated',
+        ])
+
+        tags = [self.tags[0].id, self.tags[1].id]
+        writes = self.update(
+            recipe, ingredients=self.amounts(6)[1:], tags=tags, name='New')
+        self.assertEqual(sorted(writes), [
+            'DELETE FROM "recipes_ingredientamount"',
+            'DELETE FROM "recipes_recipe_tags"',
+            'INSERT INTO "recipes_ingredientamount"',
+            'UPDATE "recipes_recipe" SET name, updated',
+        ])
+        self.assertEqual(
+            set(IngredientAmount.objects.filter(recipe=recipe).values_list(
+                'ingredient_id', 'amount')),
+            {(item['id'], 1) for item in self.amounts(6)[1:]})
+        self.assertEqual(
+            sorted(recipe.tags.values_list('id', flat=True)), tags)
+        self.assertEqual(Recipe.objects.get(id=recipe.id).name, 'New')
+
+    def test_partial_update(self):
+        recipe = Recipe.objects.get(
+            id=self.create_recipe(self.amounts(2)).data['id'])
+        url = reverse('api:recipes-detail', args=[recipe.id])
+        response = self.client.patch(url, {'name': 'New'}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['name'], 'New')
+        self.assertEqual(len(response.data['ingredients']), 2)
+        self.assertEqual(len(response.data['tags']), len(self.tags))
+        response = self.client.patch(url, {'ingredients': []}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ingredients', response.data)
@@ -0,0 +1,63 @@
+import datetime
+import decimal
+import io
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from api import renderers
+from api.renderers import FastJSONRenderer
+from recipes.models import Ingredient
+
+DATA = {
+    'name': 'сахар', 'amount': decimal.Decimal('1.50'), 'items': [1, None],
+    'date': datetime.date(2022, 5, 1), 1: True,
+}
+
+
+class FastJSONRendererTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create([
+            Ingredient(name=f'ингредиент {i:03}', measurement_unit='г')
+            for i in range(50)
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_output_matches_standard_renderer(self):
+        self.assertEqual(
+            FastJSONRenderer().render(DATA), JSONRenderer().render(DATA))
+
+    def test_fallback_without_orjson(self):
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(
+                FastJSONRenderer().render(DATA), JSONRenderer().render(DATA))
+
+    def test_indent_uses_standard_renderer(self):
+        self.assertEqual(
+            FastJSONRenderer().render(
+                DATA, 'application/json; indent=2'),
+            JSONRenderer().render(DATA, 'application/json; indent=2'))
+
+    def test_large_responses_are_compressed(self):
+        url = reverse('api:ingredients-list')
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertIn(response['Content-Encoding'], ('gzip', 'br'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+        response = self.client.get(url)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(len(response.json()), 50)
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command(
+            'benchmark_responses', '/api/ingredients/', repeat=1, stdout=out)
+        self.assertIn('/api/ingredients/: ', out.getvalue())
+        self.assertIn('B gzip', out.getvalue())
@@ -0,0 +1,146 @@
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITransactionTestCase
+
+from recipes.invalidation import invalidate
+from recipes.models import (Favorite, Ingredient, IngredientAmount, Recipe,
+                            Shopping)
+from recipes.versions import get_version
+from users.models import Follow, User
+
+
+class RecipeResponseCacheTests(APITransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author, self.user = [
+            User.objects.create(
+                email=f'{name}@example.com', username=name,
+                first_name='Name', last_name='Surname')
+            for name in ('author', 'user')
+        ]
+        self.recipes = [
+            Recipe.objects.create(
+                author=self.author, name=f'Recipe {i}', text='Text',
+                cooking_time=1, image='api/images/recipes/image.png')
+            for i in range(2)
+        ]
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        Shopping.objects.create(user=self.user, recipe=self.recipes[1])
+        Follow.objects.create(user=self.user, following=self.author)
+
+    def flags(self, user, url=None, **params):
+        self.client.force_authenticate(user)
+        response = self.client.get(
+            url or reverse('api:recipes-list'), params)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return [
+            (recipe['name'], recipe['is_favorited'],
+             recipe['is_in_shopping_cart'], recipe['author']['is_subscribed'])
+            for recipe in data.get('results', [data])
+        ]
+
+    def test_user_flags_over_shared_response(self):
+        anonymous = [
+            ('Recipe 1', False, False, False),
+            ('Recipe 0', False, False, False),
+        ]
+        user = [
+            ('Recipe 1', False, True, True),
+            ('Recipe 0', True, False, True),
+        ]
+        for _ in range(2):
+            self.assertEqual(self.flags(None), anonymous)
+            self.assertEqual(self.flags(self.user), user)
+            self.assertEqual(self.flags(self.author), anonymous)
+        detail = reverse('api:recipes-detail', args=[self.recipes[0].id])
+        self.assertEqual(self.flags(None, detail), anonymous[1:])
+        self.assertEqual(self.flags(self.user, detail), user[1:])
+
+    def test_user_filters_are_not_cached(self):
+        self.assertEqual(self.flags(self.user, is_favorited=1), [
+            ('Recipe 0', True, False, True)])
+        self.assertEqual(self.flags(self.author, is_favorited=1), [])
+
+    def test_changes_are_shown(self):
+        self.flags(None)
+        recipe = self.recipes[1]
+        recipe.name = 'Renamed'
+        recipe.save()
+        self.assertEqual(self.flags(None)[0][0], 'Renamed')
+        self.author.first_name = 'Other'
+        self.author.save()
+        response = self.client.get(reverse('api:recipes-list'))
+        self.assertEqual(
+            response.json()['results'][0]['author']['first_name'], 'Other')
+
+    def test_favorites_and_feed_lists(self):
+        self.assertEqual(self.flags(self.user, is_favorited=1), [
+            ('Recipe 0', True, False, True)])
+        self.client.post(
+            reverse('api:recipes-favorite', args=[self.recipes[1].id]))
+        self.assertEqual(len(self.flags(self.user, is_favorited=1)), 2)
+        feed = reverse('api:recipes-feed')
+        subscribe = reverse('api:user-subscribe', args=[self.author.id])
+        self.client.delete(subscribe)
+        self.assertEqual(self.flags(self.user, feed), [])
+        self.client.post(subscribe)
+        self.assertEqual(len(self.flags(self.user, feed)), 2)
+
+    def test_invalidation_is_batched_per_transaction(self):
+        version = get_version('recipe_lists')
+        with transaction.atomic():
+            for recipe in self.recipes:
+                recipe.save()
+            self.assertEqual(get_version('recipe_lists'), version)
+        self.assertEqual(get_version('recipe_lists'), version + 1)
+        try:
+            with transaction.atomic():
+                invalidate('recipe_lists')
+                raise ValueError
+        except ValueError:
+            pass
+        invalidate('recipes')
+        self.assertEqual(get_version('recipe_lists'), version + 1)
+
+    def test_user_changes_invalidate_their_recipes(self):
+        names = ['recipes', 'recipe_lists', f'author:{self.author.id}',
+                 f'recipe:{self.recipes[0].id}', f'author:{self.user.id}']
+
+        def versions():
+            return [get_version(name) for name in names]
+
+        before = versions()
+        User.objects.create(
+            email='new@example.com', username='new',
+            first_name='Name', last_name='Surname')
+        self.assertEqual(versions(), before)
+        self.author.first_name = 'Other'
+        self.author.save()
+        after = versions()
+        self.assertEqual(after[0], before[0])
+        self.assertEqual(after[4], before[4])
+        self.assertEqual(
+            [new - old for old, new in zip(before[1:4], after[1:4])],
+            [1, 1, 1])
+
+    def test_ingredient_rows_look_up_the_author_once(self):
+        recipe = self.recipes[0]
+        IngredientAmount.objects.bulk_create([
+            IngredientAmount(recipe=recipe, amount=1, ingredient=(
+                Ingredient.objects.create(
+                    name=f'ingredient {i}', measurement_unit='г')))
+            for i in range(3)
+        ])
+        version = get_version(f'author:{self.author.id}')
+        with CaptureQueriesContext(connection) as captured:
+            IngredientAmount.objects.filter(recipe=recipe).delete()
+        lookups = [
+            query for query in captured
+            if query['sql'].startswith('SELECT "recipes_recipe"."author_id"')
+        ]
+        self.assertEqual(len(lookups), 1)
+        self.assertEqual(get_version(f'author:{self.author.id}'), version + 1)
@@ -0,0 +1,72 @@
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from recipes.models import Ingredient, IngredientAmount, Recipe, Tag
+from users.models import User
+
+RECIPES = (
+    ('Борщ', 'Суп со свеклой и капустой', ('свекла', 'капуста')),
+    ('Винегрет', 'Салат, почти как борщ, только холодный', ('свекла',)),
+    ('Щи', 'Суп из капусты', ('капуста',)),
+    ('Оладьи', 'Жарить на сковороде', ('мука', 'кефир')),
+)
+
+
+class RecipeSearchTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(
+            email='cook@example.com', username='cook',
+            first_name='Name', last_name='Surname')
+        cls.tag = Tag.objects.create(name='Суп', color='#000000', slug='soup')
+        cls.recipes = {}
+        for name, text, ingredients in RECIPES:
+            recipe = Recipe.objects.create(
+                author=author, name=name, text=text, cooking_time=1,
+                image='api/images/recipes/image.png')
+            for ingredient in ingredients:
+                IngredientAmount.objects.create(
+                    recipe=recipe, amount=1,
+                    ingredient=Ingredient.objects.get_or_create(
+                        name=ingredient, measurement_unit='г')[0])
+            cls.recipes[name] = recipe
+        cls.recipes['Щи'].tags.add(cls.tag)
+
+    def setUp(self):
+        # Test data is rolled back without committing, the cache is cleared
+        # to reload the search index.
+        cache.clear()
+
+    def search(self, query, **params):
+        response = self.client.get(
+            reverse('api:recipes-list'), {'search': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['name'] for recipe in response.json()['results']]
+
+    def test_ranked_by_field(self):
+        # The name weighs more than the ingredients and the description.
+        self.assertEqual(self.search('борщ'), ['Борщ', 'Винегрет'])
+        self.assertEqual(self.search('Свекл'), ['Борщ', 'Винегрет'])
+
+    def test_all_words_must_match(self):
+        self.assertEqual(self.search('суп капуст'), ['Щи', 'Борщ'])
+        self.assertEqual(self.search('суп кефир'), [])
+
+    def test_combined_with_filters(self):
+        self.assertEqual(self.search('суп', tags='soup'), ['Щи'])
+        response = self.client.get(reverse('api:recipes-list'), {
+            'search': 'капуста', 'limit': 1})
+        self.assertEqual(response.json()['count'], 2)
+
+    def test_explicit_ordering(self):
+        self.assertEqual(
+            self.search('суп', ordering='id'), ['Борщ', 'Щи'])
+
+    def test_index_follows_changes(self):
+        recipe = self.recipes['Оладьи']
+        recipe.name = 'Блины'
+        recipe.save()
+        cache.clear()
+        self.assertEqual(self.search('блины'), ['Блины'])
@@ -0,0 +1,260 @@
+import csv
+import io
+
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from recipes.models import (Ingredient, IngredientAmount, Recipe, Shopping,
+                            ShoppingListItem, Tag, User)
+from .base import TemporaryMediaMixin, image_data
+
+
+class ShoppingCartTestCase(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            email='cook@example.com', username='cook',
+            first_name='Name', last_name='Surname')
+        cls.tag = Tag.objects.create(name='Tag', color='#000000', slug='tag')
+        cls.sugar = Ingredient.objects.create(
+            name='сахар', measurement_unit='г')
+        cls.flour = Ingredient.objects.create(
+            name='мука', measurement_unit='г')
+        cls.recipes = []
+        for sugar, flour in ((10, 200), (5, 300)):
+            recipe = Recipe.objects.create(
+                author=cls.user, name='Recipe', text='Text', cooking_time=1,
+                image='api/images/recipes/image.png')
+            recipe.tags.add(cls.tag)
+            IngredientAmount.objects.create(
+                recipe=recipe, ingredient=cls.sugar, amount=sugar)
+            IngredientAmount.objects.create(
+                recipe=recipe, ingredient=cls.flour, amount=flour)
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        for recipe in self.recipes:
+            response = self.client.post(
+                reverse('api:recipes-shopping-cart', args=[recipe.id]))
+            self.assertEqual(response.status_code, 201)
+
+    def totals(self):
+        return dict(ShoppingListItem.objects.filter(
+            user=self.user).values_list('ingredient__name', 'total_amount'))
+
+
+class ShoppingListItemTests(TemporaryMediaMixin, ShoppingCartTestCase):
+
+    def test_add_recipes(self):
+        self.assertEqual(self.totals(), {'сахар': 15, 'мука': 500})
+
+    def test_remove_recipe(self):
+        response = self.client.delete(
+            reverse('api:recipes-shopping-cart', args=[self.recipes[0].id]))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.totals(), {'сахар': 5, 'мука': 300})
+        response = self.client.delete(
+            reverse('api:recipes-shopping-cart', args=[self.recipes[1].id]))
+        self.assertEqual(self.totals(), {})
+
+    def test_batch(self):
+        first, second = self.recipes
+        url = reverse('api:recipes-shopping-cart-batch')
+        response = self.client.delete(
+            url, {'ids': [first.id, 9999]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [
+            {'id': first.id, 'status': 'removed'},
+            {'id': 9999, 'status': 'not_added'},
+        ])
+        self.assertEqual(self.totals(), {'сахар': 5, 'мука': 300})
+
+        response = self.client.post(
+            url, {'ids': [first.id, second.id, first.id, 9999]},
+            format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [
+            {'id': first.id, 'status': 'added'},
+            {'id': second.id, 'status': 'already_added'},
+            {'id': 9999, 'status': 'not_found'},
+        ])
+        self.assertEqual(self.totals(), {'сахар': 15, 'мука': 500})
+        first.refresh_from_db()
+        self.assertEqual(first.in_carts_count, 1)
+
+        for data in ({}, {'ids': []}, {'ids': ['a']}):
+            with self.subTest(data=data):
+                response = self.client.post(url, data, format='json')
+                self.assertEqual(response.status_code, 400)
+
+    def test_repeated_batch(self):
+        url = reverse('api:recipes-shopping-cart-batch')
+        ids = [recipe.id for recipe in self.recipes]
+        for method, statuses in (('delete', ('removed', 'not_added')),
+                                 ('post', ('added', 'already_added'))):
+            for status in statuses:
+                with CaptureQueriesContext(connection) as captured:
+                    response = getattr(self.client, method)(
+                        url, {'ids': ids}, format='json')
+                self.assertEqual(
+                    {result['status'] for result in response.data['results']},
+                    {status})
+                # The user is locked before the shopping list is read.
+                tables = [
+                    table for query in captured
+                    for table in ('"users_user"', '"recipes_shopping"')
+                    if f'FROM {table}' in query['sql']
+                ]
+                self.assertEqual(tables[:2], [
+                    '"users_user"', '"recipes_shopping"'])
+        self.assertEqual(self.totals(), {'сахар': 15, 'мука': 500})
+        self.assertEqual(
+            list(Recipe.objects.values_list('in_carts_count', flat=True)),
+            [1, 1])
+
+    def test_favorite_batch(self):
+        url = reverse('api:recipes-favorite-batch')
+        ids = [recipe.id for recipe in self.recipes]
+        response = self.client.post(url, {'ids': ids}, format='json')
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['added', 'added'])
+        self.assertEqual(
+            list(Recipe.objects.values_list('favorites_count', flat=True)),
+            [1, 1])
+        response = self.client.delete(url, {'ids': ids}, format='json')
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['removed', 'removed'])
+        self.assertFalse(self.user.owner.exists())
+
+    def test_clear(self):
+        response = self.client.delete(
+            reverse('api:recipes-clear-shopping-cart'))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.totals(), {})
+        self.assertFalse(self.user.byer.exists())
+        self.assertEqual(
+            list(Recipe.objects.values_list('in_carts_count', flat=True)),
+            [0, 0])
+
+    def test_update_recipe_ingredients(self):
+        salt = Ingredient.objects.create(name='соль', measurement_unit='г')
+        response = self.client.patch(
+            reverse('api:recipes-detail', args=[self.recipes[0].id]),
+            {'tags': [self.tag.id],
+             'ingredients': [{'id': self.sugar.id, 'amount': 20},
+                             {'id': salt.id, 'amount': 1}],
+             'name': 'Recipe', 'text': 'Text', 'cooking_time': 1,
+             'image': image_data()},
+            format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            self.totals(), {'сахар': 25, 'мука': 300, 'соль': 1})
+
+    def test_delete_recipe(self):
+        response = self.client.delete(
+            reverse('api:recipes-detail', args=[self.recipes[1].id]))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.totals(), {'сахар': 10, 'мука': 200})
+
+    def export(self, user=None):
+        self.client.force_authenticate(user or self.user)
+        response = self.client.get(
+            reverse('api:recipes-download-shopping-cart'))
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_changes_outside_the_api(self):
+        # As done by the admin: each row is deleted through the ORM.
+        Shopping.objects.get(user=self.user, recipe=self.recipes[0]).delete()
+        self.assertEqual(self.export(), 'Мука (г) - 300\nСахар (г) - 5\n')
+        Shopping.objects.create(user=self.user, recipe=self.recipes[0])
+        Recipe.objects.get(id=self.recipes[1].id).delete()
+        self.assertEqual(self.export(), 'Мука (г) - 200\nСахар (г) - 10\n')
+
+    def test_author_deleted(self):
+        author = User.objects.create(
+            email='author@example.com', username='author',
+            first_name='Name', last_name='Surname')
+        recipe = Recipe.objects.create(
+            author=author, name='Recipe', text='Text', cooking_time=1,
+            image='api/images/recipes/image.png')
+        IngredientAmount.objects.create(
+            recipe=recipe, ingredient=self.sugar, amount=1)
+        Shopping.objects.create(user=self.user, recipe=recipe)
+        self.assertEqual(self.totals(), {'сахар': 16, 'мука': 500})
+        author.delete()
+        self.assertEqual(self.export(), 'Мука (г) - 500\nСахар (г) - 15\n')
+
+    def test_rebuild(self):
+        ShoppingListItem.objects.update(total_amount=1)
+        ShoppingListItem.objects.filter(ingredient=self.sugar).delete()
+        call_command('update_counters', stdout=io.StringIO())
+        self.assertEqual(self.export(), 'Мука (г) - 500\nСахар (г) - 15\n')
+
+
+class DownloadShoppingCartTests(ShoppingCartTestCase):
+
+    url = reverse('api:recipes-download-shopping-cart')
+
+    def download(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_txt_is_default(self):
+        response, content = self.download()
+        self.assertEqual(
+            response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertEqual(
+            response['Content-Disposition'],
+            'attachment; filename="shopping_list.txt"')
+        self.assertEqual(
+            content.decode(), 'Мука (г) - 500\nСахар (г) - 15\n')
+
+    def test_csv(self):
+        response, content = self.download(format='csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.reader(io.StringIO(content.decode())))
+        self.assertEqual(rows, [
+            ['name', 'measurement_unit', 'amount'],
+            ['мука', 'г', '500'],
+            ['сахар', 'г', '15'],
+        ])
+
+    def test_pdf(self):
+        response, content = self.download(format='pdf')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(content.startswith(b'%PDF'))
+
+    def test_empty_cart(self):
+        for recipe in self.recipes:
+            self.client.delete(
+                reverse('api:recipes-shopping-cart', args=[recipe.id]))
+        response, content = self.download()
+        self.assertEqual(content, b'')
+
+    def test_json_accept_header(self):
+        response = self.client.get(self.url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['Content-Type'], 'text/plain; charset=utf-8')
+
+    def test_unknown_format(self):
+        response = self.client.get(self.url, {'format': 'docx'})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('detail', response.json())
+
+    def test_anonymous(self):
+        self.client.force_authenticate(None)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('detail', response.json())
@@ -0,0 +1,35 @@
+from django.urls import reverse
+
+from recipes.models import Recipe
+from .base import SeededAPITestCase
+
+
+class SubscriptionsTests(SeededAPITestCase):
+
+    def test_recipes_limit(self):
+        url = reverse('api:user-subscriptions')
+        for limit, expected in (('3', 3), ('0', 10), ('abc', 10), (None, 10)):
+            params = {'limit': 50}
+            if limit is not None:
+                params['recipes_limit'] = limit
+            with self.subTest(recipes_limit=limit):
+                authors = self.client.get(url, params).json()['results']
+                self.assertEqual(len(authors), 10)
+                for author in authors:
+                    newest = list(Recipe.objects.filter(
+                        author=author['id']).order_by('-id').values_list(
+                        'id', flat=True)[:expected])
+                    self.assertEqual(
+                        [recipe['id'] for recipe in author['recipes']],
+                        newest)
+                    self.assertEqual(author['recipes_count'], 10)
+                    self.assertTrue(author['is_subscribed'])
+
+    def test_subscribe_response_is_limited(self):
+        author = self.recipe.author
+        url = reverse('api:user-subscribe', args=[author.id])
+        self.client.delete(url)
+        response = self.client.post(f'{url}?recipes_limit=2')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['recipes']), 2)
+        self.assertTrue(response.data['is_subscribed'])
@@ -1,23 +1,50 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import F, Sum
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjoserViewSet
 from rest_framework import filters, mixins, permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
 
-from recipes.models import Favorite, Ingredient, Recipe, Shopping, Tag
-from users.models import Follow
-from .filters import IngredientFilter, RecipeFilter
+from recipes.autocomplete import ingredient_index
+from recipes.feed import (fan_out, feed_recipes, follow_author,
+                          unfollow_author)
+from recipes.images import schedule_image_processing
+from recipes.invalidation import invalidate, user_versions
+from recipes.models import (Favorite, Ingredient, Recipe, Shopping,
+                            ShoppingListItem, Tag)
+from recipes.pantry import pantry_index
+from users.models import Follow, annotate_subscribed
+from .cache import (RecipeConditionalMixin, RecipeResponseCacheMixin,
+                    ReferenceDataCacheMixin)
+from .exports import EXPORTERS, shopping_cart_rows
+from .filters import IngredientFilter, RecipeFilter, RecipeSearchFilter
+from .negotiation import FallbackContentNegotiation
+from .parsers import MultiPartJSONParser
 from .permissions import IsAdminOrAuthor, IsAdminOrAuthorOrReadOnly
-from .serializers import (FavoriteSerializer, FollowSerializer,
-                          IngredientSerializer, RecipeSerializer,
-                          RecipeSerializerGet, ShoppingSerializer,
-                          SubscribeSerializer, TagSerializer)
+from .renderers import (CSVRenderer, FastJSONRenderer, PDFRenderer,
+                        PlainTextRenderer)
+from .serializers import (IngredientSerializer, PantryRecipeSerializer,
+                          PantrySerializer, RecipeIdsSerializer,
+                          RecipeSerializer, RecipeSerializerGet,
+                          RecipeSmallSerializer, SubscribeSerializer,
+                          TagSerializer)
 
 User = get_user_model()
 
 
+def lock_user(user):
+    """Lock the row of the user until the end of the transaction."""
+    list(User.objects.select_for_update().filter(
+        id=user.id).values_list('id'))
+
+
 class UserViewSet(DjoserViewSet):
     """Get, create user(s) or get, create or delete subscription(s).
 
@@ -44,60 +71,76 @@ class UserViewSet(DjoserViewSet):
     ordering_fields = ('id',)
     ordering = ('id',)
 
+    def get_queryset(self):
+        return annotate_subscribed(super().get_queryset(), self.request.user)
+
     @action(detail=True, methods=['post', 'delete'],
             permission_classes=[permissions.IsAuthenticated])
+    @transaction.atomic
     def subscribe(self, request, id=None):
-        """Create or delete a subscription to another user."""
+        """Create or delete a subscription to another user.
+
+        The unique constraint of subscriptions settles concurrent requests.
+        """
         if request.method == 'POST':
-            already_follow = Follow.objects.filter(
-                user=self.request.user.id, following=int(self.kwargs['id']))
-            if already_follow.exists():
+            following = get_object_or_404(User, id=id)
+            if following == request.user:
+                return Response({
+                    'errors': 'Подписка на себя невозможна!'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                with transaction.atomic():
+                    Follow.objects.create(
+                        user=request.user, following=following)
+            except IntegrityError:
                 return Response({
                     'errors': 'You are already following this user'
                     }, status=status.HTTP_400_BAD_REQUEST)
-            following = int(self.kwargs['id'])
-            user = self.request.user.id
-            serializer = FollowSerializer(
-                data={'following': following, 'user': user},
-                context={'request': request})
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
+            User.objects.filter(id=following.id).update(
+                followers_count=F('followers_count') + 1)
+            follow_author(
+                request.user, following, following.followers_count + 1)
+            following.subscribed = True
             response = SubscribeSerializer(
-                serializer.instance.following, context={'request': request})
+                following, context={'request': request})
             return Response(response.data, status=status.HTTP_201_CREATED)
-        if request.method == 'DELETE':
-            follow = Follow.objects.filter(
-                user=self.request.user.id, following=int(self.kwargs['id']))
-            if follow.exists():
-                follow.delete()
-            else:
-                return Response({
-                    'errors': 'This subscription is missing'
-                    }, status=status.HTTP_400_BAD_REQUEST)
+        deleted, _ = Follow.objects.filter(
+            user=request.user, following=id).delete()
+        if not deleted:
+            return Response({
+                'errors': 'This subscription is missing'
+                }, status=status.HTTP_400_BAD_REQUEST)
+        User.objects.filter(id=id).update(
+            followers_count=Greatest(F('followers_count') - 1, 0))
+        unfollow_author(request.user, id)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=False,
             permission_classes=[permissions.IsAuthenticated, IsAdminOrAuthor])
     def subscriptions(self, request):
         """Get the users that the current user is following."""
-        sub_user = User.objects.filter(following__user=self.request.user)
-        page = self.paginate_queryset(sub_user.order_by('id'))
+        sub_user = annotate_subscribed(
+            User.objects.filter(following__user=self.request.user),
+            self.request.user).order_by('id')
+        page = self.paginate_queryset(sub_user)
+        authors = page if page is not None else list(sub_user)
+        SubscribeSerializer.prefetch_recipes(authors, request)
+        serializer = SubscribeSerializer(
+            authors, context={'request': request}, many=True)
         if page is not None:
-            serializer = SubscribeSerializer(
-                page, context={'request': request}, many=True)
             return self.get_paginated_response(serializer.data)
-        serializer = SubscribeSerializer(
-            sub_user, context={'request': request}, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-class IngredientViewSet(mixins.ListModelMixin,
+class IngredientViewSet(ReferenceDataCacheMixin,
+                        mixins.ListModelMixin,
                         mixins.RetrieveModelMixin,
                         viewsets.GenericViewSet):
     """Displaying a list of ingredients or a single ingredient.
 
     list:
     Get a list of ingredients.
+    Search ingredients for autocomplete by `name`, at most `limit` of them.
 
     retrieve:
     Get a ingredient by id.
@@ -106,12 +149,32 @@ class IngredientViewSet(mixins.ListModelMixin,
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
+    reference_name = 'ingredients'
     filter_backends = (IngredientFilter,)
     filterset_class = RecipeFilter
-    search_fields = ('^name',)
 
-
-class TagViewSet(mixins.ListModelMixin,
+    def get_limit(self):
+        """Return the positive `limit` query parameter or None."""
+        try:
+            limit = int(self.request.query_params['limit'])
+        except (KeyError, ValueError):
+            return None
+        return limit if limit > 0 else None
+
+    def get_list_response(self, request, *args, **kwargs):
+        name = request.query_params.get(IngredientFilter.search_param)
+        limit = self.get_limit()
+        if name and settings.INGREDIENT_SEARCH_IN_MEMORY:
+            return Response(ingredient_index.search(name, limit))
+        queryset = self.filter_queryset(self.get_queryset())
+        if limit is not None:
+            queryset = queryset[:limit]
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+
+class TagViewSet(ReferenceDataCacheMixin,
+                 mixins.ListModelMixin,
                  mixins.RetrieveModelMixin,
                  viewsets.GenericViewSet):
     """Displaying a list of tags or a single tag.
@@ -126,13 +189,16 @@ class TagViewSet(mixins.ListModelMixin,
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
+    reference_name = 'tags'
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(RecipeConditionalMixin, RecipeResponseCacheMixin,
+                    viewsets.ModelViewSet):
     """Recipe(s) display on Get, Post, Patch, Del.
 
     list:
     Get a list of recipes.
+    Search recipes by name, ingredients and description with `search`.
 
     create:
     Create a recipe.
@@ -145,53 +211,131 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     destroy:
     Remove a recipe by id.
+
+    A recipe is sent as JSON with a base64 image, or as multipart form data
+    with the image as a file and `tags` and `ingredients` as JSON.
     """
 
     queryset = Recipe.objects.all()
     permission_classes = [IsAdminOrAuthorOrReadOnly]
+    parser_classes = (JSONParser, MultiPartJSONParser)
+    multipart_json_fields = ('tags', 'ingredients')
     filter_backends = (DjangoFilterBackend,
-                       filters.OrderingFilter)
+                       filters.OrderingFilter,
+                       RecipeSearchFilter)
     filterset_class = RecipeFilter
     ordering_fields = ('id',)
     ordering = ('-id',)
 
+    def get_queryset(self):
+        return Recipe.objects.for_feed(self.get_queryset_user())
+
     def get_serializer_class(self):
         if self.request.method == 'GET':
             return RecipeSerializerGet
         return RecipeSerializer
 
+    @transaction.atomic
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
+        User.objects.filter(id=self.request.user.id).update(
+            recipes_count=F('recipes_count') + 1)
+        fan_out(serializer.instance)
+        schedule_image_processing(serializer.instance)
 
     def perform_update(self, serializer):
-        serializer.save(author=self.request.user)
-
-    def add_favorite_shopping(self, request, model, ser, err_text):
-        """Add/remove a recipe to/from the favorites/shopping list."""
+        new_image = 'image' in serializer.validated_data
+        if new_image:
+            serializer.save(author=self.request.user, thumbnails_ready=False)
+            schedule_image_processing(serializer.instance)
+        else:
+            serializer.save(author=self.request.user)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        with ShoppingListItem.objects.updated_in_bulk():
+            ShoppingListItem.objects.drop_recipe(instance)
+            instance.delete()
+        User.objects.filter(id=instance.author_id).update(
+            recipes_count=Greatest(F('recipes_count') - 1, 0))
+
+    @action(detail=False, permission_classes=[permissions.IsAuthenticated])
+    def feed(self, request):
+        """Get the newest recipes of the authors the user is following."""
+        return self.cached_response(request, self.get_feed_response)
+
+    def get_feed_response(self):
+        queryset = self.filter_queryset(
+            feed_recipes(self.get_queryset(), self.request.user))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+    @action(detail=False)
+    def pantry(self, request):
+        """Recipes cooked best with the given `ingredients` ids.
+
+        Recipes are ordered by the fraction of their ingredients found
+        among the given ones, the `limit` best are returned.
+        """
+        query = PantrySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        matches = pantry_index.match(
+            query.validated_data['ingredients'],
+            query.validated_data['limit'])
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in matches])
+        results = []
+        for recipe_id, matched, total in matches:
+            recipe = recipes.get(recipe_id)
+            if recipe is None:
+                continue
+            recipe.coverage = round(matched / total, 4)
+            recipe.missing_ingredients = total - matched
+            results.append(recipe)
+        serializer = PantryRecipeSerializer(
+            results, many=True, context=self.get_serializer_context())
+        return Response(serializer.data)
+
+    @transaction.atomic
+    def add_favorite_shopping(self, request, model, err_text, counter):
+        """Add/remove a recipe to/from the favorites/shopping list.
+
+        `counter` is the field of the recipe counting the users who added it.
+        The unique constraint of the list settles concurrent requests,
+        the user row is locked so they also wait for the batch changes.
+        """
+        lock_user(request.user)
+        recipe_id = self.kwargs['pk']
         if request.method == 'POST':
-            already = model.objects.filter(
-                user=self.request.user.id, recipe=int(self.kwargs['pk']))
-            if already.exists():
+            recipe = Recipe.objects.filter(id=recipe_id).first()
+            if recipe is None:
                 return Response({
-                    'errors': f'Recipe already in {err_text}'
+                    'errors': 'Recipe does not exist'
                     }, status=status.HTTP_400_BAD_REQUEST)
-            recipe = int(self.kwargs['pk'])
-            user = self.request.user.id
-            serializer = ser(
-                data={'recipe': recipe, 'user': user},
-                context={'request': request})
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        if request.method == 'DELETE':
-            already = model.objects.filter(
-                user=self.request.user.id, recipe=int(self.kwargs['pk']))
-            if already.exists():
-                already.delete()
-            else:
+            try:
+                with transaction.atomic():
+                    model.objects.create(user=request.user, recipe=recipe)
+            except IntegrityError:
                 return Response({
-                    'errors': f'Recipe is not on the {err_text}'
+                    'errors': f'Recipe already in {err_text}'
                     }, status=status.HTTP_400_BAD_REQUEST)
+            Recipe.objects.filter(id=recipe.id).update(
+                **{counter: F(counter) + 1})
+            serializer = RecipeSmallSerializer(
+                recipe, context={'request': request})
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        deleted, _ = model.objects.filter(
+            user=request.user, recipe=recipe_id).delete()
+        if not deleted:
+            return Response({
+                'errors': f'Recipe is not on the {err_text}'
+                }, status=status.HTTP_400_BAD_REQUEST)
+        Recipe.objects.filter(id=recipe_id).update(
+            **{counter: Greatest(F(counter) - 1, 0)})
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=['post', 'delete'],
@@ -199,33 +343,124 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def favorite(self, request, pk=None):
         """Add/remove a recipe to/from the favorites list."""
         return self.add_favorite_shopping(
-            request, Favorite, FavoriteSerializer, 'избранном')
+            request, Favorite, 'избранном', 'favorites_count')
 
     @action(detail=True, methods=['post', 'delete'],
             permission_classes=[permissions.IsAuthenticated])
     def shopping_cart(self, request, pk=None):
         """Add/remove a recipe to/from the shopping list."""
         return self.add_favorite_shopping(
-            request, Shopping, ShoppingSerializer, 'в списке покупок')
+            request, Shopping, 'в списке покупок', 'in_carts_count')
+
+    @transaction.atomic
+    def batch_favorite_shopping(self, request, model, counter):
+        """Add/remove several recipes to/from the favorites/shopping list.
+
+        Return the result for every requested recipe id. The user row is
+        locked before the present rows are read, so concurrent changes of
+        the lists of the user cannot count the same rows twice.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        lock_user(request.user)
+        present = set(model.objects.filter(
+            user=request.user, recipe__in=ids).values_list(
+                'recipe', flat=True))
+        if request.method == 'POST':
+            found = set(Recipe.objects.filter(
+                id__in=set(ids) - present).values_list('id', flat=True))
+            model.objects.bulk_create([
+                model(user=request.user, recipe_id=recipe_id)
+                for recipe_id in found
+            ], ignore_conflicts=True)
+            # Bulk inserts send no signals.
+            invalidate(*user_versions(
+                request.user.id,
+                'favorites' if model is Favorite else 'cart'))
+            changed, sign = found, 1
+            results = {
+                recipe_id: 'added' if recipe_id in found else
+                'already_added' if recipe_id in present else 'not_found'
+                for recipe_id in ids
+            }
+        else:
+            with ShoppingListItem.objects.updated_in_bulk():
+                model.objects.filter(
+                    user=request.user, recipe__in=present).delete()
+            changed, sign = present, -1
+            results = {
+                recipe_id: 'removed' if recipe_id in present else 'not_added'
+                for recipe_id in ids
+            }
+        if changed:
+            Recipe.objects.filter(id__in=changed).update(
+                **{counter: Greatest(F(counter) + sign, 0)})
+            if model is Shopping:
+                ShoppingListItem.objects.add_recipes(
+                    request.user.id, changed, sign)
+        return Response({'results': [
+            {'id': recipe_id, 'status': result}
+            for recipe_id, result in results.items()
+        ]})
+
+    @action(detail=False, methods=['post', 'delete'],
+            url_path='favorite/batch',
+            permission_classes=[permissions.IsAuthenticated])
+    def favorite_batch(self, request):
+        """Add/remove the recipes listed in `ids` to/from the favorites."""
+        return self.batch_favorite_shopping(
+            request, Favorite, 'favorites_count')
+
+    @action(detail=False, methods=['post', 'delete'],
+            url_path='shopping_cart/batch',
+            permission_classes=[permissions.IsAuthenticated])
+    def shopping_cart_batch(self, request):
+        """Add/remove the recipes listed in `ids` to/from the shopping list."""
+        return self.batch_favorite_shopping(
+            request, Shopping, 'in_carts_count')
+
+    @action(detail=False, methods=['delete'], url_path='shopping_cart',
+            permission_classes=[permissions.IsAuthenticated])
+    @transaction.atomic
+    def clear_shopping_cart(self, request):
+        """Remove every recipe from the shopping list."""
+        cart = Shopping.objects.filter(user=request.user)
+        recipe_ids = list(cart.values_list('recipe', flat=True))
+        with ShoppingListItem.objects.updated_in_bulk():
+            cart.delete()
+        Recipe.objects.filter(id__in=recipe_ids).update(
+            in_carts_count=Greatest(F('in_carts_count') - 1, 0))
+        ShoppingListItem.objects.clear(request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """Render the errors of the shopping list download as JSON."""
+        response = super().finalize_response(
+            request, response, *args, **kwargs)
+        if (self.action == 'download_shopping_cart'
+                and getattr(response, 'exception', False)):
+            response.accepted_renderer = FastJSONRenderer()
+            response.accepted_media_type = FastJSONRenderer.media_type
+        return response
 
     @action(detail=False,
-            permission_classes=[permissions.IsAuthenticated, IsAdminOrAuthor])
+            permission_classes=[permissions.IsAuthenticated, IsAdminOrAuthor],
+            renderer_classes=[PlainTextRenderer, CSVRenderer, PDFRenderer],
+            content_negotiation_class=FallbackContentNegotiation)
     def download_shopping_cart(self, request):
-        """Return the shopping list."""
-        data_ingredient = Recipe.objects.filter(
-            shopping_recipe__user=self.request.user).values(
-                ingredient_name=F(
-                    'recipe_to_ingredient__ingredient__name'
-                ),
-                ingredient_measurement_unit=F(
-                    'recipe_to_ingredient__ingredient__measurement_unit'
-                )
-            ).annotate(total_amount=Sum('recipe_to_ingredient__amount'))
-        shopping_cart = list()
-        for ing in data_ingredient:
-            name = ing['ingredient_name']
-            measure = ing['ingredient_measurement_unit']
-            amount = ing['total_amount']
-            shopping_cart.append(f"{name.capitalize()} ({measure}) - {amount}")
-            response = Response(shopping_cart,  content_type='text/plain')
+        """Return the shopping list as a txt, csv or pdf file.
+
+        The format is chosen with the `format` query parameter,
+        the file is streamed while the ingredients are read from the database.
+        """
+        renderer = request.accepted_renderer
+        rows = shopping_cart_rows(request.user).iterator()
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        response = StreamingHttpResponse(
+            EXPORTERS[renderer.format](rows), content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{renderer.format}"')
         return response
@@ -29,6 +29,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -77,6 +78,30 @@ else:
         }
     }
 
+# The cache shared by the workers: `locmem` keeps one per process, `file`
+# stores it in the CACHE_LOCATION directory and `redis` (django-redis)
+# uses any server speaking the Redis protocol at the CACHE_LOCATION url.
+# A dotted backend path is accepted too.
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django_redis.cache.RedisCache',
+}
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', default='locmem')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS.get(CACHE_BACKEND, CACHE_BACKEND),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            default=os.path.join(BASE_DIR, 'cache')
+            if CACHE_BACKEND == 'file' else ''),
+        'TIMEOUT': int(os.getenv('CACHE_TIMEOUT', default=300)),
+    }
+}
+# Lifetime of the cached recipe list and detail responses, in seconds.
+RECIPE_RESPONSE_CACHE_TIMEOUT = int(
+    os.getenv('RECIPE_RESPONSE_CACHE_TIMEOUT', default=300))
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -109,7 +134,26 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Resized copies of the recipe images, name: (max width, max height).
+RECIPE_IMAGE_VARIANTS = {
+    'detail': (1280, 1280),
+    'card': (640, 640),
+    'preview': (240, 240),
+}
+RECIPE_IMAGE_FORMAT = os.getenv('RECIPE_IMAGE_FORMAT', default='WEBP')
+RECIPE_IMAGE_QUALITY = 85
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', default=2))
+# Largest accepted recipe image, in bytes once decoded.
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', default=10 * 1024 * 1024))
+# A JSON request body must fit the base64 encoded image and the recipe.
+DATA_UPLOAD_MAX_MEMORY_SIZE = RECIPE_IMAGE_MAX_SIZE * 4 // 3 + 1024 * 1024
+
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer',
+        *(['rest_framework.renderers.BrowsableAPIRenderer'] if DEBUG else []),
+    ),
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.PageLimitPagination',
     'PAGE_SIZE': 6,
     'DEFAULT_PERMISSION_CLASSES': [
@@ -123,6 +167,23 @@ REST_FRAMEWORK = {
 
 AUTH_USER_MODEL = "users.User"
 
+INGREDIENT_SEARCH_IN_MEMORY = True
+INGREDIENT_INDEX_TTL = 300
+# Authors with at least this number of followers are not copied into
+# the feeds of their followers, their recipes are read when the feed is.
+FEED_FANOUT_MAX_FOLLOWERS = int(
+    os.getenv('FEED_FANOUT_MAX_FOLLOWERS', default=10000))
+# Number of recent recipes of an author added to the feed on subscribing.
+FEED_BACKFILL = 50
+# Text search configuration of the recipe search on PostgreSQL.
+RECIPE_SEARCH_CONFIG = 'russian'
+# Number of best matches ranked by the recipe search without PostgreSQL.
+RECIPE_SEARCH_FALLBACK_LIMIT = 1000
+
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'HIDE_USERS': False,
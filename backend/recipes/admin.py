@@ -5,16 +5,17 @@ from .models import Favorite, Ingredient, Recipe, Shopping, Tag
 
 
 class UserAdmin(admin.ModelAdmin):
-    list_display = ('first_name', 'username', 'last_name', 'email')
+    list_display = ('first_name', 'username', 'last_name', 'email',
+                    'recipes_count', 'followers_count')
     list_filter = ('email', 'username')
 
 
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author', 'is_favorited_count')
+    list_display = ('name', 'author', 'favorites_count', 'in_carts_count')
     list_filter = ('name', 'tags', 'author')
-
-    def is_favorited_count(self, obj):
-        return Favorite.objects.filter(**{'recipe': obj}).count()
+    readonly_fields = ('favorites_count', 'in_carts_count', 'created',
+                       'updated')
+    list_select_related = ('author',)
 
 
 class IngredientAdmin(admin.ModelAdmin):
@@ -0,0 +1,102 @@
+import bisect
+import threading
+import time
+
+from django.conf import settings
+
+from .models import Ingredient
+from .versions import get_version
+
+TRIGRAM = 3
+
+
+def trigrams(text):
+    """Return the set of three-letter substrings of the text."""
+    return {text[i:i + TRIGRAM] for i in range(len(text) - TRIGRAM + 1)}
+
+
+class IngredientIndex:
+    """In-process index over ingredient names for autocomplete.
+
+    Names are kept sorted, so prefix matches are found with a binary search.
+    Substring matches are looked up in trigram posting lists, which are
+    intersected before the candidates are checked. The index is loaded
+    with a single query on first use and reloaded when the `ingredients`
+    version changes, after `invalidate()` or when it is older than
+    INGREDIENT_INDEX_TTL seconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+        self._version = None
+        self._loaded_at = 0
+
+    def invalidate(self):
+        """Drop the index, it is reloaded on the next search."""
+        self._data = None
+
+    def _is_stale(self, data, version):
+        return (data is None or self._version != version
+                or time.monotonic() - self._loaded_at
+                > settings.INGREDIENT_INDEX_TTL)
+
+    def _load(self):
+        rows = Ingredient.objects.values_list(
+            'id', 'name', 'measurement_unit')
+        entries = sorted(
+            (name.casefold(), id, {
+                'id': id, 'name': name, 'measurement_unit': unit})
+            for id, name, unit in rows
+        )
+        keys = [key for key, _, _ in entries]
+        postings = {}
+        for position, key in enumerate(keys):
+            for trigram in trigrams(key):
+                postings.setdefault(trigram, []).append(position)
+        return keys, [item for _, _, item in entries], postings
+
+    def _get_data(self):
+        version = get_version('ingredients')
+        data = self._data
+        if self._is_stale(data, version):
+            with self._lock:
+                data = self._data
+                if self._is_stale(data, version):
+                    data = self._data = self._load()
+                    self._version = version
+                    self._loaded_at = time.monotonic()
+        return data
+
+    def search(self, query, limit=None):
+        """Return ingredients whose name starts with or contains the query.
+
+        Prefix matches come first, both groups are sorted by name.
+        """
+        keys, items, postings = self._get_data()
+        query = query.casefold()
+        start = bisect.bisect_left(keys, query)
+        end = start
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+        results = items[start:end]
+        if limit is not None and len(results) >= limit:
+            return results[:limit]
+        if len(query) < TRIGRAM:
+            candidates = range(len(keys))
+        else:
+            lists = sorted(
+                (postings.get(trigram, ()) for trigram in trigrams(query)),
+                key=len)
+            candidates = set(lists[0]).intersection(*lists[1:])
+            candidates = sorted(candidates)
+        for position in candidates:
+            if start <= position < end or query not in keys[position]:
+                continue
+            results.append(items[position])
+            if limit is not None and len(results) >= limit:
+                break
+        return results
+
+
+ingredient_index = IngredientIndex()
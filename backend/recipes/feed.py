@@ -0,0 +1,79 @@
+from django.conf import settings
+from django.db import models
+
+from users.models import Follow, User
+from .invalidation import invalidate
+from .models import FeedEntry, Recipe
+
+
+def is_pulled(followers_count):
+    """Whether the recipes of an author are read instead of copied."""
+    return followers_count >= settings.FEED_FANOUT_MAX_FOLLOWERS
+
+
+def fan_out(recipe):
+    """Copy a new recipe into the feeds of the followers of its author."""
+    author = User.objects.filter(id=recipe.author_id).values_list(
+        'followers_count', flat=True).first()
+    if author is None or is_pulled(author):
+        return
+    followers = Follow.objects.filter(
+        following=recipe.author_id).values_list('user', flat=True)
+    FeedEntry.objects.bulk_create((
+        FeedEntry(user_id=user, recipe_id=recipe.id,
+                  author_id=recipe.author_id)
+        for user in followers.iterator()
+    ), batch_size=300, ignore_conflicts=True)
+
+
+def backfill(user_ids, author_id):
+    """Copy the recent recipes of the author into the feeds of the users."""
+    recipes = Recipe.objects.filter(author=author_id).order_by(
+        '-id').values_list('id', flat=True)[:settings.FEED_BACKFILL]
+    FeedEntry.objects.bulk_create([
+        FeedEntry(user_id=user, recipe_id=recipe, author_id=author_id)
+        for recipe in recipes
+        for user in user_ids
+    ], batch_size=300, ignore_conflicts=True)
+
+
+def follow_author(user, author, followers_count):
+    """Fill the feed of the user who subscribed to the author.
+
+    `followers_count` is the number of followers of the author
+    including the user.
+    """
+    if not is_pulled(followers_count):
+        backfill([user.id], author.id)
+
+
+def unfollow_author(user, author_id):
+    """Drop the recipes of the author from the feed of the user.
+
+    When the author falls below the fan-out limit, the feeds of the
+    remaining followers get the recipes that were not copied.
+    """
+    FeedEntry.objects.filter(user=user, author=author_id).delete()
+    followers_count = User.objects.filter(id=author_id).values_list(
+        'followers_count', flat=True).first()
+    if followers_count == settings.FEED_FANOUT_MAX_FOLLOWERS - 1:
+        backfill(list(Follow.objects.filter(
+            following=author_id).values_list('user', flat=True)), author_id)
+        invalidate('recipe_lists')
+
+
+def feed_recipes(queryset, user):
+    """Filter the recipes of the authors followed by the user.
+
+    Copied recipes are found from the feed entries of the user, the
+    recipes of the authors above the fan-out limit by their author.
+    """
+    recipes = models.Q(id__in=models.Subquery(
+        FeedEntry.objects.filter(user=user).values('recipe_id')))
+    pulled = list(Follow.objects.filter(
+        user=user, following__followers_count__gte=(
+            settings.FEED_FANOUT_MAX_FOLLOWERS)
+    ).values_list('following', flat=True))
+    if pulled:
+        recipes |= models.Q(author__in=pulled)
+    return queryset.filter(recipes)
@@ -0,0 +1,112 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+
+from .invalidation import invalidate_recipe
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {
+    'JPEG': 'jpg',
+    'WEBP': 'webp',
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_image_format():
+    """Return the format of the variants, JPEG if Pillow lacks WebP."""
+    image_format = settings.RECIPE_IMAGE_FORMAT.upper()
+    if image_format == 'WEBP' and not features.check('webp'):
+        return 'JPEG'
+    return image_format
+
+
+def variant_name(name, variant):
+    """Return the storage name of a variant of the image."""
+    directory, file_name = os.path.split(name)
+    root = os.path.splitext(file_name)[0]
+    extension = EXTENSIONS[get_image_format()]
+    return os.path.join(directory, 'variants', f'{root}_{variant}.{extension}')
+
+
+def render_variant(image, size, image_format):
+    """Return a copy of the image fitted into the size and encoded."""
+    variant = image.copy()
+    variant.thumbnail(size, Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    variant.save(buffer, image_format,
+                 quality=settings.RECIPE_IMAGE_QUALITY, optimize=True)
+    return ContentFile(buffer.getvalue())
+
+
+def create_variants(name):
+    """Save the resized copies of the stored image."""
+    image_format = get_image_format()
+    with default_storage.open(name) as file, Image.open(file) as image:
+        image = ImageOps.exif_transpose(image)
+        has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+        image = image.convert(
+            'RGBA' if has_alpha and image_format != 'JPEG' else 'RGB')
+        for variant, size in settings.RECIPE_IMAGE_VARIANTS.items():
+            target = variant_name(name, variant)
+            default_storage.delete(target)
+            default_storage.save(
+                target, render_variant(image, size, image_format))
+
+
+def process_recipe_image(recipe_id, name):
+    """Create the variants of the recipe image and mark them as ready.
+
+    The flag is only set if the recipe still has the same image.
+    """
+    create_variants(name)
+    if Recipe.objects.filter(id=recipe_id, image=name).update(
+            thumbnails_ready=True, updated=timezone.now()):
+        invalidate_recipe(recipe_id)
+
+
+def _process_in_worker(recipe_id, name):
+    try:
+        process_recipe_image(recipe_id, name)
+    except Exception:
+        logger.exception('Cannot process the image %s', name)
+    finally:
+        connections.close_all()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_WORKERS,
+                thread_name_prefix='recipe-images')
+        return _executor
+
+
+def schedule_image_processing(recipe):
+    """Process the image of the recipe once the transaction is committed.
+
+    The work is done by a pool of threads, so the request does not wait
+    for it; with `RECIPE_IMAGE_WORKERS = 0` it is done in the request.
+    Until it is finished the original image is served.
+    """
+    recipe_id, name = recipe.id, recipe.image.name
+    if settings.RECIPE_IMAGE_WORKERS:
+        transaction.on_commit(lambda: get_executor().submit(
+            _process_in_worker, recipe_id, name))
+    else:
+        transaction.on_commit(
+            lambda: process_recipe_image(recipe_id, name))
@@ -0,0 +1,128 @@
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from .versions import bump_version, is_shared
+
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(file, fields):
+    """Yield the rows of a headerless CSV file as dicts."""
+    for row in csv.reader(file):
+        if row:
+            yield dict(zip(fields, row))
+
+
+def read_json(file, fields):
+    """Yield the objects of a JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    for chunk in iter(lambda: file.read(JSON_CHUNK_SIZE), ''):
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started and position < len(buffer):
+                if buffer[position] != '[':
+                    raise ValueError('JSON file must contain an array')
+                started = True
+                position += 1
+                continue
+            if position >= len(buffer) or buffer[position] == ']':
+                break
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except ValueError:
+                break
+            yield {field: item[field] for field in fields}
+    if buffer[position:].strip() not in ('', ']'):
+        raise ValueError('JSON file is truncated')
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
+def detect_format(path):
+    return os.path.splitext(path)[1].lstrip('.').lower()
+
+
+def import_file(model, path, fields, file_format=None, batch_size=1000):
+    """Insert the rows of a CSV or JSON file into the table of the model.
+
+    The file is streamed and inserted in batches inside one transaction,
+    rows conflicting with the unique constraints of the model are skipped,
+    so importing the same file again creates nothing.
+    Return the numbers of rows read and created and the time spent.
+    """
+    reader = READERS[file_format or detect_format(path)]
+    started = time.monotonic()
+    read = 0
+    with open(path, encoding='utf-8') as file, transaction.atomic():
+        count_before = model.objects.count()
+        rows = reader(file, fields)
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            read += len(batch)
+            unique = {tuple(row[field] for field in fields): row
+                      for row in batch}
+            model.objects.bulk_create(
+                [model(**row) for row in unique.values()],
+                ignore_conflicts=True)
+        created = model.objects.count() - count_before
+    return read, created, time.monotonic() - started
+
+
+class ImportCommand(BaseCommand):
+    """Base command to load a reference table from a CSV or JSON file."""
+
+    model = None
+    fields = ()
+    default_path = None
+    version_name = None
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=os.path.join(settings.BASE_DIR, self.default_path),
+            help='CSV file without header or JSON array of objects')
+        parser.add_argument(
+            '--format', choices=sorted(READERS),
+            help='File format, detected from the extension by default')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of rows inserted per query')
+
+    def handle(self, *args, **options):
+        try:
+            read, created, seconds = import_file(
+                self.model, options['path'], self.fields,
+                options['format'], options['batch_size'])
+        except (KeyError, OSError, ValueError) as error:
+            raise CommandError(f'Cannot import {options["path"]}: {error!r}')
+        bump_version(self.version_name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Read {read} rows, created {created} '
+            f'{self.model._meta.verbose_name_plural.lower()} '
+            f'in {seconds:.2f} s ({read / max(seconds, 1e-6):.0f} rows/s)'))
+        if created and not is_shared():
+            self.stderr.write(self.style.WARNING(
+                'The cache is local to each process: the running web server '
+                'lists the new rows at once, but its tag filter and '
+                'ingredient search only see them after CACHE_TIMEOUT and '
+                'INGREDIENT_INDEX_TTL seconds or a restart. Set '
+                'CACHE_BACKEND to file or redis to share the cache.'))
@@ -0,0 +1,128 @@
+import threading
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from users.models import Follow, User
+from .models import (Favorite, Ingredient, IngredientAmount, Recipe,
+                     Shopping, Tag)
+from .versions import bump_version
+
+# Cached responses are stored under version stamps: `recipes` for all of
+# them, `recipe:<id>` for a recipe, `author:<id>` for the recipes of an
+# author, `recipe_lists` for the other recipe lists, and `favorites:<id>`,
+# `cart:<id>` and `feed:<id>` for the lists personal to a user. The
+# receivers below map every change of the rows shown to these stamps.
+_local = threading.local()
+
+
+def recipe_versions(recipe_id, author_id):
+    """Return the version stamps of the responses showing the recipe."""
+    return (f'recipe:{recipe_id}', f'author:{author_id}', 'recipe_lists')
+
+
+def user_versions(user_id, *kinds):
+    """Return the version stamps of the responses personal to the user.
+
+    The kinds are `favorites`, `cart` and `feed`.
+    """
+    return tuple(f'{kind}:{user_id}' for kind in kinds)
+
+
+def _flush():
+    names, _local.pending = _local.pending, None
+    for name in sorted(names):
+        bump_version(name)
+
+
+def _is_pending():
+    """Whether the flush of the current transaction is still to come.
+
+    It is dropped with the callbacks of a rolled back transaction.
+    """
+    connection = transaction.get_connection()
+    return getattr(_local, 'pending', None) is not None and (
+        connection.in_atomic_block
+        and any(func is _flush for _, func in connection.run_on_commit))
+
+
+def invalidate(*names):
+    """Bump the version stamps once the current transaction commits.
+
+    The stamps invalidated during a transaction are collected and each
+    is bumped once, after the commit, so no response is cached from data
+    about to change. Outside of a transaction they are bumped at once.
+    """
+    if _is_pending():
+        _local.pending.update(names)
+        return
+    _local.pending = set(names)
+    transaction.on_commit(_flush)
+
+
+def invalidate_recipe(recipe_id, author_id=None):
+    """Invalidate the responses showing the recipe.
+
+    The author is looked up when not given, unless the recipe is already
+    invalidated in the current transaction, e.g. by its other rows.
+    """
+    if author_id is None:
+        if _is_pending() and f'recipe:{recipe_id}' in _local.pending:
+            return
+        author_id = Recipe.objects.filter(id=recipe_id).values_list(
+            'author', flat=True).first()
+    invalidate(*recipe_versions(recipe_id, author_id))
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def recipe_changed(instance, **kwargs):
+    invalidate_recipe(instance.id, instance.author_id)
+
+
+@receiver([post_save, post_delete], sender=IngredientAmount)
+def recipe_ingredient_changed(instance, **kwargs):
+    invalidate_recipe(instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(instance, action, reverse, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        invalidate('recipes')
+    else:
+        invalidate_recipe(instance.id, instance.author_id)
+
+
+@receiver([post_save, post_delete], sender=Tag)
+@receiver([post_save, post_delete], sender=Ingredient)
+def reference_data_changed(**kwargs):
+    invalidate('recipes')
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(instance, created=False, update_fields=None, **kwargs):
+    # A new user has no recipes yet, and logging in only changes the last
+    # login date: neither is shown in recipes.
+    if created or update_fields == frozenset(['last_login']):
+        return
+    recipes = Recipe.objects.filter(author=instance.id).values_list(
+        'id', flat=True)
+    invalidate(f'author:{instance.id}', 'recipe_lists',
+               *(f'recipe:{recipe}' for recipe in recipes))
+
+
+@receiver([post_save, post_delete], sender=Favorite)
+def favorite_changed(instance, **kwargs):
+    invalidate(*user_versions(instance.user_id, 'favorites'))
+
+
+@receiver([post_save, post_delete], sender=Shopping)
+def shopping_changed(instance, **kwargs):
+    invalidate(*user_versions(instance.user_id, 'cart'))
+
+
+@receiver([post_save, post_delete], sender=Follow)
+def follow_changed(instance, **kwargs):
+    invalidate(*user_versions(instance.user_id, 'feed'))
@@ -1,17 +1,13 @@
-import csv
-
-from django.core.management.base import BaseCommand
-
+from recipes.importers import ImportCommand
 from recipes.models import Ingredient
 
 
-class Command(BaseCommand):
+class Command(ImportCommand):
     """Command to automatically load a ingredient list."""
 
-    help = "Loads data from ingredients.csv"
+    help = "Loads ingredients from data/ingredients.csv or another file"
 
-    def handle(self, *args, **options):
-        with open('./data/ingredients.csv', 'r', encoding='UTF-8') as f:
-            csv_reader = csv.reader(f, delimiter=',')
-            for row in csv_reader:
-                Ingredient.objects.create(name=row[0], measurement_unit=row[1])
+    model = Ingredient
+    fields = ('name', 'measurement_unit')
+    default_path = 'data/ingredients.csv'
+    version_name = 'ingredients'
@@ -1,17 +1,13 @@
-import csv
-
-from django.core.management.base import BaseCommand
-
+from recipes.importers import ImportCommand
 from recipes.models import Tag
 
 
-class Command(BaseCommand):
+class Command(ImportCommand):
     """Command to automatically load a tag list."""
 
-    help = "Loads data from tags.csv"
+    help = "Loads tags from data/tags.csv or another file"
 
-    def handle(self, *args, **options):
-        with open('./data/tags.csv', 'r', encoding='UTF-8') as f:
-            csv_reader = csv.reader(f, delimiter=',')
-            for row in csv_reader:
-                Tag.objects.create(name=row[0], color=row[1], slug=row[2])
+    model = Tag
+    fields = ('name', 'color', 'slug')
+    default_path = 'data/tags.csv'
+    version_name = 'tags'
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """Command to create the resized pictures of the recipes."""
+
+    help = "Creates the missing resized pictures of the recipes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Recreate the pictures of every recipe')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(thumbnails_ready=False)
+        processed = 0
+        for recipe_id, name in recipes.values_list('id', 'image').iterator():
+            try:
+                process_recipe_image(recipe_id, name)
+            except OSError as error:
+                self.stderr.write(f'Cannot process {name}: {error}')
+                continue
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Created pictures of {processed} recipes'))
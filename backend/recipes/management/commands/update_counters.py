@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, Shopping, ShoppingListItem
+from users.models import Follow, User
+
+
+def count(queryset, field):
+    """Return a subquery counting the rows of queryset per `field`."""
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(count=Count('*')).values('count'),
+        output_field=models.PositiveIntegerField()), 0)
+
+
+class Command(BaseCommand):
+    """Command to recompute the counters and the shopping list totals."""
+
+    help = ("Recomputes favorites, shopping list, recipe and follower "
+            "counters and the shopping list totals")
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.update(
+            favorites_count=count(Favorite.objects, 'recipe'),
+            in_carts_count=count(Shopping.objects, 'recipe'),
+        )
+        users = User.objects.update(
+            recipes_count=count(Recipe.objects, 'author'),
+            followers_count=count(Follow.objects, 'following'),
+        )
+        items = ShoppingListItem.objects.rebuild()
+        self.stdout.write(
+            f'Updated counters of {recipes} recipes and {users} users, '
+            f'rebuilt {items} shopping list totals')
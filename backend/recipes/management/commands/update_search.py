@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from recipes.search import update_search_vectors
+
+
+class Command(BaseCommand):
+    """Command to recompute the search data of all recipes."""
+
+    help = "Recomputes the search data of all recipes"
+
+    def handle(self, *args, **options):
+        update_search_vectors()
+        self.stdout.write(self.style.SUCCESS('Updated the recipe search'))
@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_shopping_list(apps, schema_editor):
+    Shopping = apps.get_model('recipes', 'Shopping')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    # Filtered first, so the ingredients are joined once.
+    totals = Shopping.objects.filter(
+        recipe__recipe_to_ingredient__isnull=False
+    ).values(
+        'user', 'recipe__recipe_to_ingredient__ingredient'
+    ).annotate(
+        total_amount=models.Sum('recipe__recipe_to_ingredient__amount')
+    ).order_by()
+    ShoppingListItem.objects.bulk_create((
+        ShoppingListItem(
+            user_id=total['user'],
+            ingredient_id=total['recipe__recipe_to_ingredient__ingredient'],
+            total_amount=total['total_amount'])
+        for total in totals.iterator()
+    ), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0002_auto_20220619_1923'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_amount', models.PositiveIntegerField(verbose_name='Total quantity')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_items', to='recipes.Ingredient', verbose_name='Ingredient')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Shopping list item',
+                'verbose_name_plural': 'Shopping list items',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistitem',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_list_item'),
+        ),
+        migrations.RunPython(fill_shopping_list, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+from django.db import migrations, models
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Merge ingredients with the same name and unit into the oldest one."""
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientAmount = apps.get_model('recipes', 'IngredientAmount')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(
+        keep=models.Min('id'), count=models.Count('id')
+    ).filter(count__gt=1).order_by()
+    for duplicate in duplicates:
+        keep = duplicate['keep']
+        others = list(Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit'],
+        ).exclude(id=keep).values_list('id', flat=True))
+        for amount in IngredientAmount.objects.filter(ingredient__in=others):
+            kept = IngredientAmount.objects.filter(
+                recipe_id=amount.recipe_id, ingredient_id=keep).first()
+            if kept is None:
+                amount.ingredient_id = keep
+                amount.save(update_fields=['ingredient'])
+            else:
+                kept.amount += amount.amount
+                kept.save(update_fields=['amount'])
+                amount.delete()
+        for item in ShoppingListItem.objects.filter(ingredient__in=others):
+            kept = ShoppingListItem.objects.filter(
+                user_id=item.user_id, ingredient_id=keep).first()
+            if kept is None:
+                item.ingredient_id = keep
+                item.save(update_fields=['ingredient'])
+            else:
+                kept.total_amount += item.total_amount
+                kept.save(update_fields=['total_amount'])
+                item.delete()
+        Ingredient.objects.filter(id__in=others).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_ingredient_name_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient_unit'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_ingredient_unique_name_unit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='thumbnails_ready',
+            field=models.BooleanField(
+                default=False, editable=False,
+                verbose_name='Resized pictures are ready'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.db import migrations
+
+SEARCH_VECTOR_SQL = '''
+    setweight(to_tsvector(%s, recipes_recipe.name), 'A')
+    || setweight(to_tsvector(%s, coalesce((
+        SELECT string_agg(recipes_ingredient.name, ' ')
+        FROM recipes_ingredientamount
+        JOIN recipes_ingredient
+            ON recipes_ingredient.id = recipes_ingredientamount.ingredient_id
+        WHERE recipes_ingredientamount.recipe_id = recipes_recipe.id
+    ), '')), 'B')
+    || setweight(to_tsvector(%s, recipes_recipe.text), 'C')
+'''
+
+
+def add_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector')
+    schema_editor.execute(
+        f'UPDATE recipes_recipe SET search_vector = {SEARCH_VECTOR_SQL}',
+        [settings.RECIPE_SEARCH_CONFIG] * 3)
+    schema_editor.execute(
+        'CREATE INDEX recipes_recipe_search_vector '
+        'ON recipes_recipe USING gin (search_vector)')
+
+
+def drop_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'ALTER TABLE recipes_recipe DROP COLUMN search_vector')
+
+
+class Migration(migrations.Migration):
+    """Weighted full-text search vector of the recipes with a GIN index.
+
+    The column exists on PostgreSQL only and is not a model field,
+    it is kept up to date by recipes.search.
+    """
+
+    dependencies = [
+        ('recipes', '0007_recipe_thumbnails_ready'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_vector, drop_search_vector),
+    ]
@@ -1,7 +1,10 @@
+import threading
+from contextlib import contextmanager
+
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import models, transaction
 
-from users.models import User
+from users.models import User, annotate_subscribed
 
 
 class Tag(models.Model):
@@ -30,11 +33,67 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ingredient'
         verbose_name_plural = 'Ingredients'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient_unit')
+        ]
 
     def __str__(self):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Queries for recipes."""
+
+    def with_user_flags(self, user):
+        """Annotate `is_favorited` and `is_in_shopping_cart` for the user."""
+        if user.is_authenticated:
+            return self.annotate(
+                is_favorited=models.Exists(Favorite.objects.filter(
+                    user=user, recipe=models.OuterRef('pk'))),
+                is_in_shopping_cart=models.Exists(Shopping.objects.filter(
+                    user=user, recipe=models.OuterRef('pk'))),
+            )
+        return self.annotate(
+            is_favorited=models.Value(
+                False, output_field=models.BooleanField()),
+            is_in_shopping_cart=models.Value(
+                False, output_field=models.BooleanField()),
+        )
+
+    def for_feed(self, user):
+        """Prepare recipes for serialization in a constant number of queries.
+
+        Tags, ingredients and authors are fetched in batches, and
+        the flags depending on the current user are annotated:
+        `is_favorited` and `is_in_shopping_cart` on the recipe,
+        `subscribed` on its author.
+        """
+        authors = annotate_subscribed(User.objects.all(), user)
+        return self.with_user_flags(user).prefetch_related(
+            'tags',
+            models.Prefetch('author', queryset=authors),
+            models.Prefetch(
+                'recipe_to_ingredient',
+                queryset=IngredientAmount.objects.select_related('ingredient')
+            ),
+        )
+
+    def latest_per_author(self, author_ids, limit=None):
+        """Return the newest `limit` recipes of each of the authors.
+
+        The limit is applied per author in a correlated subquery,
+        so the recipes beyond it are never fetched from the database.
+        """
+        queryset = self.filter(author_id__in=author_ids).order_by('-id')
+        if limit is None:
+            return queryset
+        return queryset.filter(id__in=models.Subquery(
+            Recipe.objects.filter(author_id=models.OuterRef('author_id'))
+            .order_by('-id').values('id')[:limit]))
+
+
 class Recipe(models.Model):
     """Recipe storage model."""
 
@@ -46,11 +105,21 @@ class Recipe(models.Model):
         User, on_delete=models.CASCADE, related_name='recipe')
     image = models.ImageField(
         upload_to='api/images/recipes/', verbose_name='Picture')
+    thumbnails_ready = models.BooleanField(
+        'Resized pictures are ready', default=False, editable=False)
     name = models.CharField('Название рецепта', max_length=200, db_index=True)
     text = models.TextField('Description')
     cooking_time = models.PositiveSmallIntegerField(
         'Cooking time (in minutes)',
         validators=[MinValueValidator(1)])
+    favorites_count = models.PositiveIntegerField(
+        'Added to favorites', default=0, editable=False)
+    in_carts_count = models.PositiveIntegerField(
+        'Added to shopping lists', default=0, editable=False)
+    created = models.DateTimeField('Published', auto_now_add=True)
+    updated = models.DateTimeField('Updated', auto_now=True)
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Recipe'
@@ -122,3 +191,186 @@ class Shopping(models.Model):
 
     def __str__(self):
         return f'{self.user.username} on {self.recipe.name}'
+
+
+_shopping_list = threading.local()
+
+
+class ShoppingListItemQuerySet(models.QuerySet):
+    """Incremental maintenance of the shopping list totals.
+
+    Shopping rows saved or deleted one by one update the totals through
+    the receivers in `recipes.signals`. Callers changing many rows at
+    once update the totals in bulk within `updated_in_bulk()`.
+    """
+
+    @contextmanager
+    def updated_in_bulk(self):
+        """Let the caller update the totals of the rows changed in a block."""
+        previous = getattr(_shopping_list, 'in_bulk', False)
+        _shopping_list.in_bulk = True
+        try:
+            yield
+        finally:
+            _shopping_list.in_bulk = previous
+
+    def is_updated_in_bulk(self):
+        return getattr(_shopping_list, 'in_bulk', False)
+
+    def add_recipes(self, user_id, recipe_ids, sign=1):
+        """Add the ingredients of the recipes to the user's totals."""
+        amounts = IngredientAmount.objects.filter(
+            recipe__in=recipe_ids).values('ingredient').annotate(
+                total=models.Sum('amount')).order_by()
+        self.apply({
+            (user_id, amount['ingredient']): sign * amount['total']
+            for amount in amounts
+        })
+
+    def remove_recipes(self, user_id, recipe_ids):
+        """Subtract the ingredients of the recipes from the user's totals."""
+        self.add_recipes(user_id, recipe_ids, sign=-1)
+
+    def clear(self, user):
+        """Empty the user's totals."""
+        self.filter(user=user).delete()
+
+    def change_recipe(self, recipe, deltas):
+        """Apply changed ingredient amounts of a recipe.
+
+        `deltas` maps ingredient ids to the change of their amount,
+        it is applied to every user having the recipe in the shopping list.
+        """
+        deltas = {
+            ingredient: delta for ingredient, delta in deltas.items() if delta
+        }
+        if not deltas:
+            return
+        users = Shopping.objects.filter(
+            recipe=recipe).values_list('user', flat=True)
+        self.apply({
+            (user, ingredient): delta
+            for user in users for ingredient, delta in deltas.items()
+        })
+
+    def drop_recipe(self, recipe):
+        """Subtract a recipe about to be deleted from all shopping lists."""
+        self.change_recipe(recipe, {
+            ingredient: -amount for ingredient, amount
+            in recipe.recipe_to_ingredient.values_list('ingredient', 'amount')
+        })
+
+    def rebuild(self):
+        """Recompute all the totals from the shopping lists.
+
+        Return the number of totals.
+        """
+        # Filtered first, so the ingredients are joined once.
+        totals = Shopping.objects.filter(
+            recipe__recipe_to_ingredient__isnull=False
+        ).values(
+            'user', 'recipe__recipe_to_ingredient__ingredient'
+        ).annotate(
+            total_amount=models.Sum('recipe__recipe_to_ingredient__amount')
+        ).order_by()
+        with transaction.atomic():
+            self.all().delete()
+            return len(self.bulk_create((
+                self.model(
+                    user_id=total['user'],
+                    ingredient_id=total[
+                        'recipe__recipe_to_ingredient__ingredient'],
+                    total_amount=total['total_amount'])
+                for total in totals.iterator()
+            ), batch_size=300))
+
+    def apply(self, deltas):
+        """Add deltas keyed by (user id, ingredient id) to the totals."""
+        if not deltas:
+            return
+        user_ids = {user for user, _ in deltas}
+        ingredient_ids = {ingredient for _, ingredient in deltas}
+        with transaction.atomic():
+            # Lock the users in a stable order, so concurrent changes of one
+            # shopping list are serialized and cannot insert the same item.
+            list(User.objects.select_for_update().filter(
+                id__in=user_ids).order_by('id').values_list('id'))
+            items = {
+                (item.user_id, item.ingredient_id): item
+                for item in self.filter(
+                    user__in=user_ids, ingredient__in=ingredient_ids)
+            }
+            to_create, to_update, to_delete = [], [], []
+            for key, delta in deltas.items():
+                item = items.get(key)
+                if item is None:
+                    if delta > 0:
+                        to_create.append(self.model(
+                            user_id=key[0], ingredient_id=key[1],
+                            total_amount=delta))
+                    continue
+                item.total_amount += delta
+                if item.total_amount > 0:
+                    to_update.append(item)
+                else:
+                    to_delete.append(item.id)
+            self.bulk_create(to_create)
+            self.bulk_update(to_update, ['total_amount'])
+            if to_delete:
+                self.filter(id__in=to_delete).delete()
+
+
+class ShoppingListItem(models.Model):
+    """Model for storing the ingredient totals of the shopping list.
+
+    It is kept up to date when recipes are added to or removed from the
+    shopping list and when their ingredients change.
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='shopping_list')
+    ingredient = models.ForeignKey(
+        Ingredient, on_delete=models.CASCADE, verbose_name='Ingredient',
+        related_name='shopping_list_items')
+    total_amount = models.PositiveIntegerField('Total quantity')
+
+    objects = ShoppingListItemQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Shopping list item'
+        verbose_name_plural = 'Shopping list items'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item')
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient} ({self.total_amount}) for {self.user}'
+
+
+class FeedEntry(models.Model):
+    """Model for storing the recipes of the followed authors of a user.
+
+    Rows are written when a recipe is published and when the user
+    subscribes, so the feed is read from the (user, recipe) index.
+    Authors with many followers are not copied, see `recipes.feed`.
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='feed_entries')
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name='feed_entries')
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        verbose_name = 'Feed entry'
+        verbose_name_plural = 'Feed entries'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'], name='unique_feed_entry')
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} for {self.user}'
@@ -0,0 +1,122 @@
+import heapq
+import threading
+from array import array
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import IngredientAmount
+from .versions import bump_version, get_version
+
+CHANGE_KEY = 'pantry:change:{}'
+# Number of changes applied one by one before the index is reloaded.
+MAX_CHANGES = 100
+
+
+def record_change(recipe_id):
+    """Bump the `pantry` version and remember which recipe it is for."""
+    version = bump_version('pantry')
+    cache.set(CHANGE_KEY.format(version), recipe_id, timeout=3600)
+
+
+def schedule_pantry_update(recipe_id):
+    """Record the change of the recipe ingredients after the commit."""
+    transaction.on_commit(lambda: record_change(recipe_id))
+
+
+class PantryIndex:
+    """In-process inverted index from ingredients to the recipes using them.
+
+    Recipes are ranked by the fraction of their ingredients found among
+    the given ones. Every change of the ingredients of a recipe bumps the
+    `pantry` version and stores the recipe id under it, so the index of
+    each process only reloads the rows of the recipes changed since its
+    version; it is rebuilt when too many changes are missed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._recipes = None
+        self._postings = None
+        self._version = None
+
+    def _load(self):
+        recipes = defaultdict(set)
+        rows = IngredientAmount.objects.values_list(
+            'recipe', 'ingredient').iterator()
+        for recipe, ingredient in rows:
+            recipes[recipe].add(ingredient)
+        postings = defaultdict(lambda: array('L'))
+        for recipe, ingredients in recipes.items():
+            for ingredient in ingredients:
+                postings[ingredient].append(recipe)
+        self._recipes = dict(recipes)
+        self._postings = postings
+
+    def _reload(self, recipe_ids):
+        """Replace the ingredients of the recipes with the stored ones."""
+        stored = defaultdict(set)
+        rows = IngredientAmount.objects.filter(
+            recipe__in=recipe_ids).values_list('recipe', 'ingredient')
+        for recipe, ingredient in rows:
+            stored[recipe].add(ingredient)
+        for recipe in recipe_ids:
+            old = self._recipes.pop(recipe, set())
+            new = stored.get(recipe, set())
+            for ingredient in old - new:
+                posting = self._postings[ingredient]
+                del posting[posting.index(recipe)]
+            for ingredient in new - old:
+                self._postings[ingredient].append(recipe)
+            if new:
+                self._recipes[recipe] = new
+
+    def _changed_recipes(self, version):
+        """Return the recipes changed since the loaded version or None."""
+        if not isinstance(self._version, int) or not (
+                0 <= version - self._version <= MAX_CHANGES):
+            return None
+        keys = [CHANGE_KEY.format(number)
+                for number in range(self._version + 1, version + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return None
+        return set(changes.values())
+
+    def _update(self):
+        version = get_version('pantry')
+        if self._recipes is not None and self._version == version:
+            return
+        with self._lock:
+            if self._recipes is not None and self._version == version:
+                return
+            changed = None
+            if self._recipes is not None:
+                changed = self._changed_recipes(version)
+            if changed is None:
+                self._load()
+            else:
+                self._reload(changed)
+            self._version = version
+
+    def match(self, ingredient_ids, limit=10):
+        """Return the best covered recipes for the ingredients.
+
+        Every item is (recipe id, number of matched ingredients, number of
+        recipe ingredients), recipes using none of them are left out.
+        """
+        self._update()
+        with self._lock:
+            matched = defaultdict(int)
+            for ingredient in set(ingredient_ids):
+                for recipe in self._postings.get(ingredient, ()):
+                    matched[recipe] += 1
+            recipes = self._recipes
+            return heapq.nlargest(limit, (
+                (recipe, count, len(recipes[recipe]))
+                for recipe, count in matched.items()
+            ), key=lambda item: (item[1] / item[2], item[1], item[0]))
+
+
+pantry_index = PantryIndex()
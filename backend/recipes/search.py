@@ -0,0 +1,165 @@
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.db.models.expressions import RawSQL
+
+from .models import IngredientAmount, Recipe
+from .versions import bump_version, get_version
+
+# The stored search vector of a recipe on PostgreSQL: the name weighs most,
+# then the ingredient names, then the description. The parameters are
+# the text search configuration, three times.
+SEARCH_VECTOR_SQL = '''
+    setweight(to_tsvector(%s, recipes_recipe.name), 'A')
+    || setweight(to_tsvector(%s, coalesce((
+        SELECT string_agg(recipes_ingredient.name, ' ')
+        FROM recipes_ingredientamount
+        JOIN recipes_ingredient
+            ON recipes_ingredient.id = recipes_ingredientamount.ingredient_id
+        WHERE recipes_ingredientamount.recipe_id = recipes_recipe.id
+    ), '')), 'B')
+    || setweight(to_tsvector(%s, recipes_recipe.text), 'C')
+'''
+SEARCH_QUERY_SQL = 'websearch_to_tsquery(%s, %s)'
+
+# Weights of the fields in the in-process index.
+FIELD_WEIGHTS = (
+    ('name', 1.0),
+    ('ingredients', 0.4),
+    ('text', 0.1),
+)
+WORD = re.compile(r'\w+')
+
+
+def words(text):
+    """Return the casefolded words of the text."""
+    return WORD.findall(text.casefold())
+
+
+def uses_search_vector():
+    return connection.vendor == 'postgresql'
+
+
+def update_search_vectors(recipe_ids=None):
+    """Recompute the search data of the recipes, of all of them by default.
+
+    On PostgreSQL the stored vectors are updated, elsewhere the
+    in-process index is reloaded on its next use.
+    """
+    if not uses_search_vector():
+        bump_version('recipe_search')
+        return
+    sql = f'UPDATE recipes_recipe SET search_vector = {SEARCH_VECTOR_SQL}'
+    params = [settings.RECIPE_SEARCH_CONFIG] * 3
+    if recipe_ids is not None:
+        sql += ' WHERE recipes_recipe.id = ANY(%s)'
+        params.append(list(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def schedule_search_update(recipe_id):
+    """Update the search data of the recipe when the transaction commits,
+    once its ingredients are saved too."""
+    transaction.on_commit(lambda: update_search_vectors([recipe_id]))
+
+
+class RecipeSearchIndex:
+    """In-process inverted index of recipe words, used without PostgreSQL.
+
+    Every word of the name, ingredient names and description is mapped
+    to the recipes containing it with a score weighted by the field.
+    A query word matches the indexed words it is a prefix of, which
+    covers most word endings. The index is loaded on first use and
+    reloaded when the `recipe_search` version changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+        self._version = None
+
+    def _load(self):
+        ingredients = defaultdict(list)
+        for recipe, name in IngredientAmount.objects.values_list(
+                'recipe', 'ingredient__name').iterator():
+            ingredients[recipe].append(name)
+        postings = defaultdict(lambda: defaultdict(float))
+        for id, name, text in Recipe.objects.values_list(
+                'id', 'name', 'text').iterator():
+            fields = {
+                'name': name,
+                'ingredients': ' '.join(ingredients[id]),
+                'text': text,
+            }
+            for field, weight in FIELD_WEIGHTS:
+                for word in words(fields[field]):
+                    postings[word][id] += weight
+        return sorted(postings), {
+            word: dict(scores) for word, scores in postings.items()}
+
+    def _get_data(self):
+        version = get_version('recipe_search')
+        data = self._data
+        if data is None or self._version != version:
+            with self._lock:
+                data = self._data
+                if data is None or self._version != version:
+                    data = self._data = self._load()
+                    self._version = version
+        return data
+
+    def search(self, query):
+        """Return the scores of the recipes containing all query words."""
+        terms, postings = self._get_data()
+        scores = None
+        for word in set(words(query)):
+            matches = defaultdict(float)
+            start = bisect_left(terms, word)
+            for term in terms[start:]:
+                if not term.startswith(word):
+                    break
+                for id, score in postings[term].items():
+                    matches[id] += score
+            if scores is None:
+                scores = matches
+            else:
+                scores = {
+                    id: score + matches[id] for id, score in scores.items()
+                    if id in matches
+                }
+            if not scores:
+                return {}
+        return scores or {}
+
+
+recipe_search_index = RecipeSearchIndex()
+
+
+def search_recipes(queryset, query):
+    """Filter the recipes matching the query, annotated with `search_rank`.
+
+    PostgreSQL matches the GIN-indexed search vectors, other databases
+    use the in-process index and rank its RECIPE_SEARCH_FALLBACK_LIMIT
+    best matches.
+    """
+    if uses_search_vector():
+        config = settings.RECIPE_SEARCH_CONFIG
+        return queryset.extra(
+            where=[f'recipes_recipe.search_vector @@ {SEARCH_QUERY_SQL}'],
+            params=[config, query],
+        ).annotate(search_rank=RawSQL(
+            f'ts_rank_cd(recipes_recipe.search_vector, {SEARCH_QUERY_SQL})',
+            (config, query), output_field=models.FloatField()))
+    scores = recipe_search_index.search(query)
+    best = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))[
+        :settings.RECIPE_SEARCH_FALLBACK_LIMIT]
+    return queryset.filter(id__in=[id for id, _ in best]).annotate(
+        search_rank=models.Case(
+            *[models.When(id=id, then=models.Value(score))
+              for id, score in best],
+            default=models.Value(0.0), output_field=models.FloatField()))
@@ -0,0 +1,58 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import (Ingredient, IngredientAmount, Recipe, Shopping,
+                     ShoppingListItem, Tag)
+from .pantry import schedule_pantry_update
+from .search import schedule_search_update, update_search_vectors
+from .versions import bump_version
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def ingredient_changed(**kwargs):
+    bump_version('ingredients')
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_renamed(instance, created, **kwargs):
+    if created:
+        return
+    recipe_ids = list(IngredientAmount.objects.filter(
+        ingredient=instance).values_list('recipe', flat=True))
+    if recipe_ids:
+        transaction.on_commit(lambda: update_search_vectors(recipe_ids))
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def recipe_changed(instance, **kwargs):
+    schedule_search_update(instance.id)
+    schedule_pantry_update(instance.id)
+
+
+@receiver([post_save, post_delete], sender=IngredientAmount)
+def recipe_ingredient_changed(instance, **kwargs):
+    schedule_search_update(instance.recipe_id)
+    schedule_pantry_update(instance.recipe_id)
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def tag_changed(**kwargs):
+    bump_version('tags')
+
+
+@receiver(post_save, sender=Shopping)
+def shopping_added(instance, created, **kwargs):
+    if created and not ShoppingListItem.objects.is_updated_in_bulk():
+        ShoppingListItem.objects.add_recipes(
+            instance.user_id, [instance.recipe_id])
+
+
+@receiver(pre_delete, sender=Shopping)
+def shopping_removed(instance, **kwargs):
+    # Before the delete, so the ingredients of a recipe deleted with its
+    # shopping list rows are still there, e.g. from the admin or when its
+    # author is deleted.
+    if not ShoppingListItem.objects.is_updated_in_bulk():
+        ShoppingListItem.objects.remove_recipes(
+            instance.user_id, [instance.recipe_id])
@@ -0,0 +1,45 @@
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+KEY = 'version:{}'
+
+
+def is_shared():
+    """Whether the version stamps are seen by the other processes."""
+    return not isinstance(caches['default'], LocMemCache)
+
+
+def get_version(name):
+    """Return the current version stamp of the data called `name`.
+
+    A missing stamp starts from the current time in nanoseconds,
+    so it does not repeat a stamp handed out before it was evicted.
+    """
+    key = KEY.format(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def get_versions(*names):
+    """Return the current version stamps of the data called `names`."""
+    versions = cache.get_many([KEY.format(name) for name in names])
+    return [
+        versions.get(KEY.format(name)) or get_version(name)
+        for name in names
+    ]
+
+
+def bump_version(name):
+    """Change the version stamp after the data called `name` changed."""
+    key = KEY.format(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, timeout=None)
+        return version
@@ -14,6 +14,10 @@ class User(AbstractUser):
     last_name = models.CharField('Surname', max_length=150)
     password = models.CharField('Password', max_length=150)
     is_subscribed = models.BooleanField(default=False)
+    recipes_count = models.PositiveIntegerField(
+        'Number of recipes', default=0, editable=False)
+    followers_count = models.PositiveIntegerField(
+        'Number of followers', default=0, editable=False)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
@@ -48,3 +52,12 @@ class Follow(models.Model):
     def clean(self):
         if self.user == self.following:
             raise ValidationError('You can`t subscribe to yourself')
+
+
+def annotate_subscribed(queryset, user):
+    """Annotate users with `subscribed`: whether `user` follows them."""
+    if not user.is_authenticated:
+        return queryset.annotate(subscribed=models.Value(
+            False, output_field=models.BooleanField()))
+    return queryset.annotate(subscribed=models.Exists(
+        Follow.objects.filter(user=user, following=models.OuterRef('pk'))))